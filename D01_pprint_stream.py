@@ -0,0 +1,580 @@
+'''
+Streaming, size-bounded pretty printer for large structures.
+
+pprint.PrettyPrinter builds the repr of every container just to see
+whether it fits on one line, once per nesting level, and pformat() holds
+the whole result in memory. On a few hundred MB of nested detections that
+costs minutes and doubles RSS. StreamingPrettyPrinter keeps pprint's
+interface and layout, but:
+
+- it decides "fits on the line" with a repr that gives up after `width`
+  characters, so each element is looked at a bounded number of times;
+- it writes to the stream in buffered chunks as it goes and never holds
+  the whole output;
+- depth, max_items, max_string and max_bytes cap the output, marking
+  every cut with an elision marker;
+- lists of plain ints/floats are joined in one call, and past
+  summarize_over elements they are summarized (head, tail, min/max/mean).
+  NumPy arrays are summarized with NumPy's own threshold.
+
+With the limits off (the defaults, apart from summarize_over) the output
+matches pprint for dicts, lists, tuples, sets and scalars. The one
+exception is strings longer than the line, which stay on one line instead
+of being split.
+'''
+
+from operator import itemgetter
+from pathlib import Path
+import argparse
+import io
+import json
+import math
+import pprint as _pprint
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+class _TooWide(Exception):
+    pass
+
+class _Truncated(Exception):
+    pass
+
+class _safe_key:
+    """Sort key that falls back to (type name, id) for unorderable values, as pprint does"""
+    __slots__ = ('obj',)
+
+    def __init__(self, obj):
+        self.obj = obj
+
+    def __lt__(self, other):
+        try:
+            return self.obj < other.obj
+        except TypeError:
+            return (str(type(self.obj)), id(self.obj)) < (str(type(other.obj)), id(other.obj))
+
+def _safe_tuple(t):
+    return _safe_key(t[0]), _safe_key(t[1])
+
+def _recursion(obj):
+    return f"<Recursion on {type(obj).__name__} with id={id(obj)}>"
+
+def _is_ndarray(obj):
+    return type(obj).__name__ == 'ndarray' and type(obj).__module__ == 'numpy'
+
+_NUMERIC = {int, float}
+_ATOMS = {int, float, bool, str, bytes, type(None)}
+
+class _Writer:
+    """Buffers small writes into chunks and enforces max_bytes (counted in characters)"""
+    __slots__ = ('stream', 'parts', 'pending', 'written', 'limit', 'chunk')
+
+    def __init__(self, stream, limit=None, chunk=1 << 16):
+        self.stream = stream
+        self.parts = []
+        self.pending = 0
+        self.written = 0
+        self.limit = limit
+        self.chunk = chunk
+
+    def write(self, s):
+        if self.limit is not None and self.written + len(s) > self.limit:
+            self.parts.append(s[:self.limit - self.written])
+            self.written = self.limit
+            raise _Truncated
+        self.parts.append(s)
+        self.written += len(s)
+        self.pending += len(s)
+        if self.pending >= self.chunk:
+            self.flush()
+
+    def flush(self):
+        if self.parts:
+            self.stream.write(''.join(self.parts))
+            self.parts = []
+            self.pending = 0
+
+class StreamingPrettyPrinter:
+    """
+    Drop-in for pprint.PrettyPrinter (indent, width, depth, stream, compact,
+    sort_dicts, underscore_numbers) with output limits:
+
+    max_items       elements shown per container before '...<N more>'
+    max_string      characters shown per str/bytes before '...<N more chars>'
+    max_bytes       total characters written before '...<output truncated>'
+    summarize_over  numeric lists and NumPy arrays longer than this are summarized
+    """
+    def __init__(self, indent=1, width=80, depth=None, stream=None, *, compact=False,
+                 sort_dicts=True, underscore_numbers=False, max_items=None, max_string=None,
+                 max_bytes=None, summarize_over=1000, edge_items=3):
+        if indent < 0:
+            raise ValueError('indent must be >= 0')
+        if depth is not None and depth <= 0:
+            raise ValueError('depth must be > 0')
+        if not width:
+            raise ValueError('width must be != 0')
+        self._indent_per_level = indent
+        self._width = width
+        self._depth = depth
+        self._stream = stream
+        self._compact = compact
+        self._sort_dicts = sort_dicts
+        self._underscore_numbers = underscore_numbers
+        self.max_items = max_items
+        self.max_string = max_string
+        self.max_bytes = max_bytes
+        self.summarize_over = summarize_over
+        self.edge_items = edge_items
+
+    # Public interface, as in pprint.PrettyPrinter
+
+    def pprint(self, obj):
+        stream = self._stream if self._stream is not None else sys.stdout
+        self._write_to(obj, stream)
+        stream.write('\n')
+
+    def pformat(self, obj):
+        buf = io.StringIO()
+        self._write_to(obj, buf)
+        return buf.getvalue()
+
+    def isreadable(self, obj):
+        return _pprint.isreadable(obj)
+
+    def isrecursive(self, obj):
+        return _pprint.isrecursive(obj)
+
+    def _write_to(self, obj, stream):
+        out = _Writer(stream, self.max_bytes)
+        try:
+            self._format(obj, out, 0, 0, set(), 0)
+        except _Truncated:
+            out.parts.append(f"\n...<output truncated at {self.max_bytes:,} characters>")
+        out.flush()
+
+    # Bounded one-line repr
+
+    def _repr(self, obj, budget, context, level):
+        """One-line repr like pprint's _safe_repr, or None if it is longer than budget"""
+        parts = []
+        try:
+            # A copy, because bailing out of _flat skips its context.discard() calls
+            self._flat(obj, parts, [budget], set(context), level)
+        except _TooWide:
+            return None
+        return ''.join(parts)
+
+    def _emit(self, parts, left, s):
+        left[0] -= len(s)
+        if left[0] < 0:
+            raise _TooWide
+        parts.append(s)
+
+    def _elided(self, n):
+        return f"...<{n:,} more>"
+
+    def _flat(self, obj, parts, left, context, level):
+        emit = self._emit
+        typ = type(obj)
+        r = typ.__repr__
+        if typ in _NUMERIC or typ is bool or obj is None:
+            emit(parts, left, f"{obj:_d}" if self._underscore_numbers and typ is int else repr(obj))
+            return
+        if typ is str or typ is bytes or typ is bytearray:
+            emit(parts, left, self._scalar(obj))
+            return
+        if issubclass(typ, dict) and r is dict.__repr__:
+            if not obj:
+                emit(parts, left, '{}')
+                return
+            if self._depth and level >= self._depth:
+                emit(parts, left, '{...}')
+                return
+            if id(obj) in context:
+                emit(parts, left, _recursion(obj))
+                return
+            if 6 * min(len(obj), self.max_items or len(obj)) > left[0]:
+                raise _TooWide
+            if self._plain_reprs() and set(map(type, obj)) <= _ATOMS and set(map(type, obj.values())) <= _ATOMS:
+                try:
+                    items = sorted(obj.items()) if self._sort_dicts else obj.items()
+                except TypeError:
+                    pass    # mixed key types: sort with _safe_key below
+                else:
+                    emit(parts, left, '{' + ', '.join([f"{k!r}: {v!r}" for k, v in items]) + '}')
+                    return
+            context.add(id(obj))
+            emit(parts, left, '{')
+            items, extra = self._dict_items(obj)
+            for i, (k, v) in enumerate(items):
+                if i:
+                    emit(parts, left, ', ')
+                self._flat(k, parts, left, context, level + 1)
+                emit(parts, left, ': ')
+                self._flat(v, parts, left, context, level + 1)
+            if extra:
+                emit(parts, left, ', ' + self._elided(extra))
+            emit(parts, left, '}')
+            context.discard(id(obj))
+            return
+        is_list = issubclass(typ, list) and r is list.__repr__
+        if is_list or (issubclass(typ, tuple) and r is tuple.__repr__):
+            if not obj:
+                emit(parts, left, '[]' if is_list else '()')
+                return
+            open_, close = ('[', ']') if is_list else ('(', ',)' if len(obj) == 1 else ')')
+            if self._depth and level >= self._depth:
+                emit(parts, left, f"{open_}...{close}")
+                return
+            if id(obj) in context:
+                emit(parts, left, _recursion(obj))
+                return
+            # n items need at least 3n characters ('[1, 2]'); don't build a repr that cannot fit
+            if 3 * min(len(obj), self.max_items or len(obj)) > left[0]:
+                raise _TooWide
+            if is_list and self._numeric(obj):
+                emit(parts, left, '[' + ', '.join(self._numeric_reprs(obj)) + ']')
+                return
+            if self._plain_reprs() and set(map(type, obj)) <= _ATOMS:
+                emit(parts, left, repr(obj))
+                return
+            context.add(id(obj))
+            emit(parts, left, open_)
+            items, extra = self._limited(obj)
+            for i, item in enumerate(items):
+                if i:
+                    emit(parts, left, ', ')
+                self._flat(item, parts, left, context, level + 1)
+            if extra:
+                emit(parts, left, ', ' + self._elided(extra))
+            emit(parts, left, close)
+            context.discard(id(obj))
+            return
+        if (typ is set or typ is frozenset) and r in (set.__repr__, frozenset.__repr__):
+            if not obj:
+                emit(parts, left, repr(obj))
+                return
+            emit(parts, left, '{' if typ is set else 'frozenset({')
+            plain = self._plain_reprs()
+            items, extra = self._limited(obj)
+            for i, item in enumerate(items):
+                if i:
+                    emit(parts, left, ', ')
+                if plain:
+                    emit(parts, left, repr(item))   # pprint's one-line set repr, underscores and all
+                else:
+                    self._flat(item, parts, left, context, level + 1)
+            if extra:
+                emit(parts, left, ', ' + self._elided(extra))
+            emit(parts, left, '}' if typ is set else '})')
+            return
+        if _is_ndarray(obj):
+            emit(parts, left, self._ndarray_repr(obj))
+            return
+        emit(parts, left, repr(obj))
+
+    # Limits and fast paths
+
+    def _plain_reprs(self):
+        """True when builtin repr() of a container of atoms is exactly what we would print"""
+        return self.max_items is None and self.max_string is None and not self._underscore_numbers
+
+    def _scalar(self, obj):
+        if self.max_string is not None and len(obj) > self.max_string:
+            return f"{obj[:self.max_string]!r}...<{len(obj) - self.max_string:,} more chars>"
+        return repr(obj)
+
+    def _limited(self, obj):
+        """(first max_items elements, number left out)"""
+        if self.max_items is None or len(obj) <= self.max_items:
+            return obj, 0
+        if isinstance(obj, (list, tuple)):
+            return obj[:self.max_items], len(obj) - self.max_items
+        it = iter(obj)
+        return [next(it) for _ in range(self.max_items)], len(obj) - self.max_items
+
+    def _dict_items(self, obj):
+        items = obj.items()
+        if self.max_items is not None and len(obj) > self.max_items:
+            if not self._sort_dicts:
+                it = iter(items)
+                return [next(it) for _ in range(self.max_items)], len(obj) - self.max_items
+        if self._sort_dicts:
+            # Keys are unique, so sorting on the key alone gives _safe_tuple's order
+            try:
+                items = sorted(items, key=itemgetter(0))
+            except TypeError:
+                items = sorted(items, key=_safe_tuple)
+        if self.max_items is not None and len(items) > self.max_items:
+            return list(items)[:self.max_items], len(items) - self.max_items
+        return items, 0
+
+    def _numeric(self, obj):
+        # set(map(type, ...)) runs in C; bool is excluded because type(True) is bool
+        return len(obj) > 8 and set(map(type, obj)) <= _NUMERIC
+
+    def _numeric_reprs(self, obj):
+        """Reprs of a numeric list, summarized past summarize_over and capped by max_items"""
+        fmt = (lambda x: f"{x:_d}" if type(x) is int else repr(x)) if self._underscore_numbers else repr
+        if self.summarize_over is not None and len(obj) > self.summarize_over:
+            k = self.edge_items
+            return [*map(fmt, obj[:k]), self._summary(obj, len(obj) - 2 * k), *map(fmt, obj[-k:])]
+        items, extra = self._limited(obj)
+        reprs = list(map(fmt, items))
+        if extra:
+            reprs.append(self._elided(extra))
+        return reprs
+
+    def _summary(self, obj, hidden):
+        """'...<N more; min=.., max=.., mean=..>', leaving out what cannot be computed"""
+        fields = [f"{hidden:,} more"]
+        values = obj
+        if float in set(map(type, obj)):
+            values = [x for x in obj if x == x]     # NaN is unordered; it would poison min/max
+            if len(values) < len(obj):
+                fields.append(f"nan={len(obj) - len(values):,}")
+        if values:
+            fields.append(f"min={min(values)!r}, max={max(values)!r}")
+            try:
+                fields.append(f"mean={math.fsum(values) / len(values):.6g}")
+            except (OverflowError, ValueError):
+                pass    # ints beyond float range, or both inf and -inf
+        return f"...<{'; '.join(fields)}>"
+
+    def _ndarray_repr(self, obj, indent=0):
+        import numpy as np
+        threshold = sys.maxsize if self.summarize_over is None else self.summarize_over
+        with np.printoptions(threshold=threshold, edgeitems=self.edge_items):
+            rep = repr(obj)
+        return rep.replace('\n', '\n' + ' ' * indent) if indent else rep
+
+    # Layout, following pprint's _format / _format_items / _format_dict_items
+
+    def _format(self, obj, out, indent, allowance, context, level):
+        max_width = self._width - indent - allowance
+        if id(obj) in context:
+            out.write(_recursion(obj))
+            return
+        rep = self._repr(obj, max_width, context, level)
+        if rep is not None:
+            out.write(rep)
+            return
+        typ = type(obj)
+        r = typ.__repr__
+        if issubclass(typ, dict) and r is dict.__repr__:
+            self._pprint_dict(obj, out, indent, allowance, context, level + 1)
+        elif issubclass(typ, list) and r is list.__repr__:
+            if self._numeric(obj):
+                self._pprint_numeric(obj, out, indent, allowance)
+                return
+            out.write('[')
+            self._format_items(obj, out, indent, allowance + 1, context, level + 1)
+            out.write(']')
+        elif issubclass(typ, tuple) and r is tuple.__repr__:
+            out.write('(')
+            endchar = ',)' if len(obj) == 1 else ')'
+            self._format_items(obj, out, indent, allowance + len(endchar), context, level + 1)
+            out.write(endchar)
+        elif (typ is set or typ is frozenset) and r in (set.__repr__, frozenset.__repr__):
+            if not obj:
+                out.write(repr(obj))
+                return
+            if typ is set:
+                out.write('{')
+                endchar = '}'
+            else:
+                out.write('frozenset({')
+                endchar = '})'
+                indent += len('frozenset(')
+            items = sorted(obj, key=_safe_key)
+            self._format_items(items, out, indent, allowance + len(endchar), context, level + 1)
+            out.write(endchar)
+        elif _is_ndarray(obj):
+            out.write(self._ndarray_repr(obj, indent))
+        else:
+            out.write(self._scalar(obj) if typ in (str, bytes, bytearray) else repr(obj))
+
+    def _pprint_dict(self, obj, out, indent, allowance, context, level):
+        out.write('{')
+        if self._indent_per_level > 1:
+            out.write((self._indent_per_level - 1) * ' ')
+        context.add(id(obj))
+        items, extra = self._dict_items(obj)
+        indent += self._indent_per_level
+        delimnl = ',\n' + ' ' * indent
+        items = list(items)
+        last_index = len(items) - 1
+        for i, (key, value) in enumerate(items):
+            last = i == last_index and not extra
+            rep = self._repr(key, sys.maxsize, context, level)
+            out.write(rep)
+            out.write(': ')
+            self._format(value, out, indent + len(rep) + 2, allowance + 1 if last else 1, context, level)
+            if not last:
+                out.write(delimnl)
+        if extra:
+            out.write(self._elided(extra))
+        context.discard(id(obj))
+        out.write('}')
+
+    def _format_items(self, items, out, indent, allowance, context, level):
+        context_id = id(items)
+        items, extra = self._limited(items)
+        write = out.write
+        indent += self._indent_per_level
+        if self._indent_per_level > 1:
+            write((self._indent_per_level - 1) * ' ')
+        delimnl = ',\n' + ' ' * indent
+        delim = ''
+        width = max_width = self._width - indent + 1
+        context.add(context_id)
+        n = len(items)
+        for i, item in enumerate(items):
+            last = i == n - 1 and not extra
+            if last:
+                max_width -= allowance
+                width -= allowance
+            if self._compact:
+                rep = self._repr(item, max_width, context, level)
+                w = len(rep) + 2 if rep is not None else sys.maxsize
+                if width < w:
+                    width = max_width
+                    if delim:
+                        delim = delimnl
+                if width >= w:
+                    width -= w
+                    write(delim)
+                    delim = ', '
+                    write(rep)
+                    continue
+            write(delim)
+            delim = delimnl
+            self._format(item, out, indent, allowance if last else 1, context, level)
+        if extra:
+            write(delim + self._elided(extra))
+        context.discard(context_id)
+
+    def _pprint_numeric(self, obj, out, indent, allowance):
+        """Numeric list in pprint's layout, built from the reprs in one join"""
+        reprs = self._numeric_reprs(obj)
+        indent += self._indent_per_level
+        if self._compact:
+            # pprint's compact packing, with the last item leaving room for ']'
+            parts = []
+            width = max_width = self._width - indent + 1
+            last = len(reprs) - 1
+            delim = ''
+            delimnl = ',\n' + ' ' * indent
+            for i, rep in enumerate(reprs):
+                if i == last:
+                    max_width -= allowance + 1
+                    width -= allowance + 1
+                w = len(rep) + 2
+                if width < w:
+                    width = max_width
+                    if delim:
+                        delim = delimnl
+                if width >= w:
+                    width -= w
+                    parts.append(delim)
+                    delim = ', '
+                else:
+                    parts.append(delim)
+                    delim = delimnl
+                parts.append(rep)
+            body = ''.join(parts)
+        else:
+            body = (',\n' + ' ' * indent).join(reprs)
+        out.write('[' + ' ' * (self._indent_per_level - 1) + body + ']')
+
+def pformat(obj, indent=1, width=80, depth=None, **kwargs):
+    return StreamingPrettyPrinter(indent, width, depth, **kwargs).pformat(obj)
+
+def pprint(obj, stream=None, indent=1, width=80, depth=None, **kwargs):
+    StreamingPrettyPrinter(indent, width, depth, stream, **kwargs).pprint(obj)
+
+# Benchmark
+
+def detection_dump(target_bytes, seed=0):
+    """Nested per-frame detections, roughly target_bytes when printed"""
+    rng = random.Random(seed)
+    frames = []
+    size = 0
+    i = 0
+    while size < target_bytes:
+        dets = [{'class': rng.choice(['person', 'car', 'dog', 'bicycle']),
+                 'confidence': round(rng.random(), 4),
+                 'box': [round(rng.uniform(0, 1920), 1) for _ in range(4)]}
+                for _ in range(rng.randrange(1, 8))]
+        frames.append({'frame': i, 'timestamp': i / 30, 'detections': dets})
+        size += 30 + 95 * len(dets)
+        i += 1
+    return {'video': 'traffic.mp4', 'fps': 30, 'frames': frames}
+
+def _measure(printer, size, out_path):
+    """Generate and print one dump; called in a fresh interpreter by benchmark()"""
+    data = detection_dump(size)
+    base_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    with open(out_path, 'w') as f:
+        if printer == 'pprint':
+            f.write(_pprint.PrettyPrinter().pformat(data))
+        else:
+            StreamingPrettyPrinter(stream=f).pprint(data)
+    elapsed = time.perf_counter() - start
+    # ru_maxrss is KiB on Linux; report the growth caused by printing
+    extra = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - base_rss
+    print(json.dumps({'seconds': elapsed, 'extra_rss': extra * 1024}))
+
+def benchmark(sizes_mb=(10, 500), pprint_limit_mb=100):
+    """
+    Time and extra peak RSS printing detection dumps to a file with
+    pprint.pformat + write vs StreamingPrettyPrinter; pprint is skipped
+    above pprint_limit_mb, where it takes many minutes
+    """
+    print(f"{'size':>6} {'printer':<10} {'seconds':>8} {'MB/s':>7} {'extra RSS MB':>13}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for mb in sizes_mb:
+            outputs = {}
+            for printer in ('pprint', 'streaming'):
+                if printer == 'pprint' and mb > pprint_limit_mb:
+                    print(f"{mb:>4}MB {printer:<10} {'skipped':>8}")
+                    continue
+                out = Path(tmp) / f"{printer}-{mb}.txt"
+                proc = subprocess.run([sys.executable, __file__, '_measure', printer, str(mb << 20), str(out)],
+                                      capture_output=True, text=True, check=True)
+                r = json.loads(proc.stdout)
+                written = out.stat().st_size
+                outputs[printer] = out
+                print(f"{mb:>4}MB {printer:<10} {r['seconds']:>8.2f} {written / 1e6 / r['seconds']:>7.1f} "
+                      f"{r['extra_rss'] / 1e6:>13.0f}")
+            if len(outputs) == 2:
+                same = outputs['pprint'].read_text() == outputs['streaming'].read_text().rstrip('\n')
+                print(f"       output identical to pprint: {same}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Streaming pretty printer")
+    sub = parser.add_subparsers(dest='command')
+    bench = sub.add_parser('bench')
+    bench.add_argument('--sizes-mb', type=int, nargs='+', default=[10, 500])
+    bench.add_argument('--pprint-limit-mb', type=int, default=100)
+    measure = sub.add_parser('_measure')
+    measure.add_argument('printer')
+    measure.add_argument('size', type=int)
+    measure.add_argument('out')
+    args = parser.parse_args()
+
+    if args.command == 'bench':
+        benchmark(args.sizes_mb, args.pprint_limit_mb)
+    elif args.command == '_measure':
+        _measure(args.printer, args.size, args.out)
+    else:
+        test = [[110,5,112,113,114],[210,211,5,213,214],[310,311,3,313,314],[410,411,412,5,414],[5,1,512,3,3],[610,4,1,613,614],[710,1,2,713,714],[810,1,2,1,1],[1,1,2,2,2],[4,1,4,4,1014]]
+        pp = StreamingPrettyPrinter()
+        pp.pprint(test)
+        print("\nWith limits:")
+        big = {'frames': list(range(100_000)), 'names': ['detection'] * 50, 'nested': [[[[1]]]]}
+        StreamingPrettyPrinter(max_items=5, depth=3).pprint(big)
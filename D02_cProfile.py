@@ -1,15 +1,243 @@
 '''
-Day 2, June 5th 2025: 
+Day 2, June 5th 2025:
 
 Welcome to cProfile.py!
 
 A chain is only as strong as its weakest link, and as a developer,
 your weakness likely lies somewhere in your code. This library
-specializes in snitching on those links so you can revert to 
+specializes in snitching on those links so you can revert to
 the teachings of time complexity and memory access patterns.
 '''
 
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+import argparse
 import cProfile
+import functools
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+
+# Deterministic profiling of selected functions
+
+def profile(func=None, *, out_dir=None, dump_every=1):
+    """
+    Decorator that runs only this function under cProfile and keeps
+    accumulating across calls; read the totals with func.stats().
+    With out_dir, stats are also dumped to <out_dir>/<name>.<pid>.prof every
+    dump_every calls, so pool workers each leave a file for merge_stats().
+    """
+    if func is None:
+        return functools.partial(profile, out_dir=out_dir, dump_every=dump_every)
+
+    profiler = cProfile.Profile()
+    calls = 0
+    depth = 0       # nested/recursive calls must not switch the profiler off under the outer one
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        nonlocal calls, depth
+        if depth:
+            depth += 1
+            try:
+                return func(*args, **kwargs)
+            finally:
+                depth -= 1
+        depth = 1
+        profiler.enable()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profiler.disable()
+            depth = 0
+            calls += 1
+            if out_dir and calls % dump_every == 0:
+                Path(out_dir).mkdir(parents=True, exist_ok=True)
+                profiler.dump_stats(Path(out_dir) / f"{func.__name__}.{os.getpid()}.prof")
+
+    wrapper.profiler = profiler
+    wrapper.stats = lambda: pstats.Stats(profiler)
+    return wrapper
+
+@contextmanager
+def profiled(out=None):
+    """Profile the body of a with-block; yields the cProfile.Profile, dumps to `out` if given"""
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        if out:
+            profiler.dump_stats(out)
+
+# Low-overhead sampling for long runs
+
+class SamplingProfiler:
+    """
+    Statistical profiler: a background thread wakes every `interval` seconds
+    and records the current stack of each watched thread. Nothing is hooked
+    into the profiled code, so overhead stays at a few percent no matter how
+    many calls it makes. Use as a context manager; results as collapsed
+    stacks (flamegraph input) or a top-N table of self/total samples.
+    """
+    def __init__(self, interval=0.005, threads=None, max_depth=128):
+        self.interval = interval
+        self.thread_ids = threads
+        self.max_depth = max_depth
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self.thread_ids is None:
+            self.thread_ids = {threading.get_ident()}
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            for ident in self.thread_ids:
+                frame = frames.get(ident)
+                if frame is not None:
+                    self.samples[self._stack(frame)] += 1
+
+    def _stack(self, frame):
+        stack = []
+        while frame is not None and len(stack) < self.max_depth:
+            code = frame.f_code
+            stack.append(f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})")
+            frame = frame.f_back
+        return ';'.join(reversed(stack))
+
+    def collapsed(self):
+        """'root;caller;callee count' lines, the input format of flamegraph.pl / speedscope"""
+        return '\n'.join(f"{stack} {count}" for stack, count in self.samples.most_common())
+
+    def write_collapsed(self, path):
+        Path(path).write_text(self.collapsed() + '\n')
+
+    def top(self, n=20):
+        """Top functions by self samples (leaf of the stack) and total samples (anywhere on it)"""
+        own, total = Counter(), Counter()
+        for stack, count in self.samples.items():
+            frames = stack.split(';')
+            own[frames[-1]] += count
+            for f in set(frames):
+                total[f] += count
+        all_samples = sum(self.samples.values()) or 1
+        lines = [f"{'self %':>7} {'total %':>8}  function"]
+        for name, count in own.most_common(n):
+            lines.append(f"{count/all_samples:>7.1%} {total[name]/all_samples:>8.1%}  {name}")
+        return '\n'.join(lines)
+
+# Merging and exporting
+
+def merge_stats(paths, out=None):
+    """Combine .prof files (e.g. one per worker process) into one pstats.Stats"""
+    paths = [str(p) for p in paths]
+    if not paths:
+        raise ValueError("no profile files to merge")
+    stats = pstats.Stats(paths[0])
+    for path in paths[1:]:
+        stats.add(path)
+    if out:
+        stats.dump_stats(out)
+    return stats
+
+def merge_collapsed(paths, out=None):
+    """Sum collapsed-stack files from several processes into one"""
+    samples = Counter()
+    for path in paths:
+        for line in Path(path).read_text().splitlines():
+            stack, _, count = line.rpartition(' ')
+            if stack:
+                samples[stack] += int(count)
+    text = '\n'.join(f"{stack} {count}" for stack, count in samples.most_common())
+    if out:
+        Path(out).write_text(text + '\n')
+    return text
+
+def top_table(stats, n=20, sort='cumulative'):
+    """Sorted top-N table of a pstats.Stats (or anything with .stats(), like @profile functions)"""
+    if callable(getattr(stats, 'stats', None)):
+        stats = stats.stats()
+    buf = io.StringIO()
+    stream, stats.stream = stats.stream, buf
+    try:
+        stats.sort_stats(sort).print_stats(n)
+    finally:
+        stats.stream = stream
+    return buf.getvalue()
+
+def _label(func):
+    filename, line, name = func
+    return f"{name} ({Path(filename).name}:{line})" if line else name
+
+def stats_to_collapsed(stats, scale=1e6, max_depth=64, min_share=1e-3):
+    """
+    Approximate collapsed stacks from deterministic stats. cProfile only keeps
+    caller->callee edges, so each function's self time is walked up towards
+    the roots: split between its callers by the edge's self time, then
+    between their callers by edge cumulative time. Time no edge accounts for
+    (no callers, the outermost call of a recursive function, the way into a
+    cycle) starts a stack at that function, and a caller already on the
+    stack is skipped, so recursion and cycles keep all their time. A branch
+    worth less than min_share of the total is not split further. Values
+    are microseconds.
+    """
+    if callable(getattr(stats, 'stats', None)):
+        stats = stats.stats()
+    table = stats.stats
+    out = Counter()
+    floor = max(1 / scale, min_share * sum(entry[2] for entry in table.values()))
+
+    def climb(func, path, on_path, value, field):
+        _, _, tt, ct, callers = table[func]
+        own = tt if field == 2 else ct
+        # Edges are (nc, cc, tt, ct); a self-edge only re-enters func
+        outside = max(0.0, own - sum(e[field] for c, e in callers.items() if c != func))
+        options = [(c, e[field]) for c, e in callers.items()
+                   if c not in on_path and c in table and e[field] > 0]
+        total = outside + sum(w for _, w in options)
+        # Stop on the depth limit or a small enough branch, so the walk stays bounded
+        if total <= 0 or len(path) >= max_depth or value < floor:
+            out[path] += value
+            return
+        if outside:
+            out[path] += value * outside / total
+        for caller, w in options:
+            climb(caller, path + (caller,), on_path | {caller}, value * w / total, 3)
+
+    for func, (_, _, tt, _, _) in table.items():
+        if tt > 0:
+            climb(func, (func,), {func}, tt, 2)
+    stacks = Counter()
+    for path, value in out.items():
+        stacks[';'.join(_label(f) for f in reversed(path))] += value
+    return '\n'.join(f"{stack} {round(value * scale)}" for stack, value in stacks.most_common()
+                     if round(value * scale) > 0)
+
+# Demo workload
 
 def slow_func():
     return sum(i**2 for i in range(1000000))
@@ -23,5 +251,54 @@ def main():
     for _ in range(100):
         fast_func()
 
+def demo():
+    # The original: whole-program deterministic profile
+    start = time.perf_counter()
+    main()
+    plain = time.perf_counter() - start
+
+    with profiled() as profiler:
+        start = time.perf_counter()
+        main()
+        deterministic = time.perf_counter() - start
+    print("🔍 Deterministic profile (top 5 by cumulative time):")
+    print(top_table(pstats.Stats(profiler), n=5))
+
+    # Sampling: cheap enough to leave on in long runs
+    with SamplingProfiler(interval=0.005) as sampler:
+        start = time.perf_counter()
+        main()
+        sampled = time.perf_counter() - start
+    print("📈 Sampling profile:")
+    print(sampler.top(5))
+    sampler.write_collapsed('profile.collapsed.txt')
+    print("Collapsed stacks written to profile.collapsed.txt (feed to flamegraph.pl or speedscope)")
+
+    # Only slow_func under the profiler
+    global slow_func
+    slow_func = profile(slow_func)
+    main()
+    print("🎯 Profiling just slow_func:")
+    print(top_table(slow_func, n=3, sort='tottime'))
+
+    print(f"\n⏱️  Overhead: none {plain:.2f}s, cProfile {deterministic:.2f}s "
+          f"({deterministic/plain:.1f}x), sampling {sampled:.2f}s ({sampled/plain:.2f}x)")
+
 if __name__ == "__main__":
-    cProfile.run('main()')
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Profiling demo and report tools")
+    sub = parser.add_subparsers(dest='command')
+    merge = sub.add_parser('merge', help="merge .prof files from several processes")
+    merge.add_argument('files', nargs='+')
+    merge.add_argument('--out', help="write the merged .prof here")
+    merge.add_argument('--top', type=int, default=20)
+    merge.add_argument('--sort', default='cumulative')
+    merge.add_argument('--collapsed', help="also write approximate collapsed stacks here")
+    args = parser.parse_args()
+
+    if args.command == 'merge':
+        stats = merge_stats(args.files, args.out)
+        print(top_table(stats, args.top, args.sort))
+        if args.collapsed:
+            Path(args.collapsed).write_text(stats_to_collapsed(stats) + '\n')
+    else:
+        demo()
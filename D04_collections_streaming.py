@@ -0,0 +1,275 @@
+'''
+Bounded-memory streaming statistics built from the D04_collections tools.
+
+SlidingWindow keeps D04's deque(maxlen=n) idea, but updates sum, mean,
+min and max in O(1) per event instead of re-scanning the window. It keeps
+a running sum and two monotonic deques: the front of one is always the
+window minimum, the front of the other the maximum.
+
+CountMinTopK replaces an ever-growing Counter with a Count-Min sketch: a
+depth x width table of counters whose size is fixed up front. Each
+estimate is at least the true count, and exceeds it by more than
+e/width * N with probability at most exp(-depth), where N is the number
+of events seen. A small candidate set tracks the current heavy hitters
+for top(). update() takes any hashable; update_many() takes a NumPy
+array of non-negative integer ids and hashes the whole batch at once.
+'''
+
+from collections import Counter, deque
+import argparse
+import math
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+class SlidingWindow:
+    """sum/mean/min/max of the last `size` values, O(1) amortized per push"""
+    __slots__ = ('size', 'values', '_sum', '_mins', '_maxs', '_index', '_since_resum')
+
+    def __init__(self, size):
+        self.size = size
+        self.values = deque(maxlen=size)
+        self._sum = 0
+        self._mins = deque()     # (index, value), values increasing
+        self._maxs = deque()     # (index, value), values decreasing
+        self._index = 0
+        self._since_resum = 0
+
+    def push(self, x):
+        values = self.values
+        if len(values) == self.size:
+            self._sum -= values[0]
+        values.append(x)
+        self._sum += x
+        i = self._index
+        self._index = i + 1
+        mins, maxs = self._mins, self._maxs
+        while mins and mins[-1][1] >= x:
+            mins.pop()
+        mins.append((i, x))
+        while maxs and maxs[-1][1] <= x:
+            maxs.pop()
+        maxs.append((i, x))
+        oldest = i - self.size
+        if mins[0][0] <= oldest:
+            mins.popleft()
+        if maxs[0][0] <= oldest:
+            maxs.popleft()
+        # Float add/subtract drifts; re-sum once per window length (still O(1) amortized)
+        self._since_resum += 1
+        if self._since_resum >= self.size:
+            self._sum = sum(values)
+            self._since_resum = 0
+
+    def __len__(self):
+        return len(self.values)
+
+    @property
+    def sum(self):
+        return self._sum
+
+    @property
+    def mean(self):
+        return self._sum / len(self.values) if self.values else math.nan
+
+    @property
+    def min(self):
+        return self._mins[0][1] if self._mins else None
+
+    @property
+    def max(self):
+        return self._maxs[0][1] if self._maxs else None
+
+_MASK64 = (1 << 64) - 1
+
+class CountMinTopK:
+    """
+    Approximate counts and top-k heavy hitters in fixed memory. width and
+    depth come from the error bounds: with width = ceil(e / epsilon) and
+    depth = ceil(ln(1 / delta)), an estimate exceeds the true count by more
+    than epsilon * N with probability at most delta.
+    """
+    def __init__(self, k=10, epsilon=1e-4, delta=1e-3, seed=0):
+        self.k = k
+        # Multiply-shift hashing needs a power-of-two width
+        self.width = 1 << max(1, math.ceil(math.log2(math.e / epsilon)))
+        self.depth = max(1, math.ceil(math.log(1 / delta)))
+        self._shift = 64 - int(math.log2(self.width))
+        rng = np.random.default_rng(seed)
+        # odd multipliers, as multiply-shift requires
+        self._a = rng.integers(1, 1 << 63, self.depth, dtype=np.uint64) | np.uint64(1)
+        self._b = rng.integers(0, 1 << 63, self.depth, dtype=np.uint64)
+        self._a_int = [int(a) for a in self._a]
+        self._b_int = [int(b) for b in self._b]
+        self.table = np.zeros((self.depth, self.width), dtype=np.int64)
+        self.total = 0
+        self._candidates = {}    # item -> estimate, at most 2k entries
+        self._threshold = 0
+
+    def _columns(self, item):
+        x = hash(item) & _MASK64
+        return [((a * x + b) & _MASK64) >> self._shift for a, b in zip(self._a_int, self._b_int)]
+
+    def update(self, item, count=1):
+        table = self.table
+        estimate = None
+        for row, col in enumerate(self._columns(item)):
+            value = table[row, col] + count
+            table[row, col] = value
+            estimate = value if estimate is None else min(estimate, value)
+        self.total += count
+        self._offer(item, int(estimate))
+
+    def _offer(self, item, estimate):
+        candidates = self._candidates
+        if item in candidates or estimate > self._threshold or len(candidates) < self.k:
+            candidates[item] = estimate
+            if len(candidates) > 2 * self.k:
+                self._prune()
+
+    def _prune(self):
+        kept = sorted(self._candidates.items(), key=lambda kv: kv[1], reverse=True)[:self.k]
+        self._candidates = dict(kept)
+        self._threshold = kept[-1][1] if len(kept) == self.k else 0
+
+    def _batch_columns(self, ids):
+        x = np.asarray(ids, dtype=np.uint64)
+        return [(a * x + b) >> np.uint64(self._shift) for a, b in zip(self._a, self._b)]
+
+    def update_many(self, ids):
+        """Count a batch of non-negative integer ids (hash(i) == i for these, so it agrees with update())"""
+        ids = np.asarray(ids)
+        if not len(ids):
+            return
+        unique, counts = np.unique(ids, return_counts=True)
+        columns = self._batch_columns(unique)
+        estimate = None
+        for row, cols in enumerate(columns):
+            self.table[row] += np.bincount(cols.astype(np.intp), counts, self.width).astype(np.int64)
+            values = self.table[row, cols]
+            estimate = values if estimate is None else np.minimum(estimate, values)
+        self.total += int(counts.sum())
+        # Bring current candidates up to date, then offer the batch's heaviest items
+        for item in self._candidates:
+            self._candidates[item] = self.estimate(item)
+        take = min(len(unique), 2 * self.k)
+        top = np.argpartition(estimate, -take)[-take:]
+        for item, est in zip(unique[top].tolist(), estimate[top].tolist()):
+            self._offer(item, est)
+
+    def estimate(self, item):
+        return int(min(self.table[row, col] for row, col in enumerate(self._columns(item))))
+
+    def top(self, n=None):
+        """[(item, estimated count), ...] highest first, like Counter.most_common"""
+        n = self.k if n is None else min(n, self.k)
+        return sorted(self._candidates.items(), key=lambda kv: kv[1], reverse=True)[:n]
+
+    def error_bound(self):
+        """(additive error, probability it is exceeded) for any single estimate"""
+        return math.e / self.width * self.total, math.exp(-self.depth)
+
+    @property
+    def nbytes(self):
+        return self.table.nbytes + sys.getsizeof(self._candidates)
+
+# Checks and benchmark
+
+def zipf_stream(n, vocabulary=1_000_000, a=1.2, seed=0):
+    rng = np.random.default_rng(seed)
+    return (rng.zipf(a, n) - 1) % vocabulary
+
+def check(n=1_000_000, k=20, window=1000, seed=0):
+    """Compare both structures with exact answers: Counter for top-k, a full re-scan for the window"""
+    events = zipf_stream(n, seed=seed)
+    exact = Counter(events.tolist())
+    sketch = CountMinTopK(k)
+    for chunk in np.array_split(events, 10):
+        sketch.update_many(chunk)
+    bound, prob = sketch.error_bound()
+    errors = [sketch.estimate(item) - count for item, count in exact.most_common(1000)]
+    assert min(errors) >= 0, "Count-Min estimates must never undercount"
+    truth = [item for item, _ in exact.most_common(k)]
+    found = [item for item, _ in sketch.top(k)]
+    recall = len(set(truth) & set(found)) / k
+    print(f"Count-Min {sketch.depth}x{sketch.width}: top-{k} recall {recall:.0%}, "
+          f"max error {max(errors)} (bound {bound:.0f} at p={prob:.3f})")
+
+    per_item = CountMinTopK(k)
+    for item in events[:100_000].tolist():
+        per_item.update(item)
+    head = Counter(events[:100_000].tolist())
+    assert [i for i, _ in per_item.top(5)] == [i for i, _ in head.most_common(5)]
+
+    w = SlidingWindow(window)
+    values = np.random.default_rng(seed).normal(size=20_000)
+    for i, x in enumerate(values.tolist()):
+        w.push(x)
+        if i % 997 == 0:
+            ref = values[max(0, i - window + 1):i + 1]
+            assert w.min == ref.min() and w.max == ref.max()
+            assert math.isclose(w.sum, ref.sum(), abs_tol=1e-9) and math.isclose(w.mean, ref.mean(), abs_tol=1e-9)
+    print("SlidingWindow matches a full re-scan of the window")
+
+def _traced(build):
+    tracemalloc.start()
+    kept = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return size, kept
+
+def benchmark(n=100_000_000, batch=1_000_000, window=1000, window_events=2_000_000, k=20):
+    """
+    events/sec and memory on a Zipf stream: Count-Min over n events in
+    batches vs an exact Counter (on the first 10M events only, because it
+    keeps growing), and the sliding window per event vs re-scanning the deque.
+    """
+    sketch = CountMinTopK(k)
+    start = time.perf_counter()
+    for lo in range(0, n, batch):
+        sketch.update_many(zipf_stream(min(batch, n - lo), seed=lo))
+    cm_time = time.perf_counter() - start
+    print(f"{n:,} events")
+    print(f"{'structure':<32} {'events/s':>12} {'memory MB':>10}")
+    print(f"{'Count-Min top-k (batched)':<32} {n / cm_time:>12,.0f} {sketch.nbytes / 1e6:>10.1f}")
+
+    exact_n = min(n, 10_000_000)
+    stream = zipf_stream(exact_n, seed=1)
+    start = time.perf_counter()
+    counter = Counter(stream.tolist())
+    exact_time = time.perf_counter() - start
+    counter_bytes, _ = _traced(lambda: Counter(stream[:exact_n // 10].tolist()))
+    print(f"{'Counter (exact)':<32} {exact_n / exact_time:>12,.0f} {counter_bytes * 10 / 1e6:>10.1f}"
+          f"  ({len(counter):,} distinct in {exact_n:,}, still growing)")
+
+    per_item = CountMinTopK(k)
+    items = stream[:200_000].tolist()
+    start = time.perf_counter()
+    for item in items:
+        per_item.update(item)
+    print(f"{'Count-Min top-k (per event)':<32} {len(items) / (time.perf_counter() - start):>12,.0f}")
+
+    values = np.random.default_rng(0).normal(size=window_events).tolist()
+    w = SlidingWindow(window)
+    start = time.perf_counter()
+    for x in values:
+        w.push(x)
+        w.mean, w.min, w.max
+    print(f"{'SlidingWindow (O(1))':<32} {window_events / (time.perf_counter() - start):>12,.0f}")
+    dq = deque(maxlen=window)
+    rescan = values[:window_events // 20]
+    start = time.perf_counter()
+    for x in rescan:
+        dq.append(x)
+        sum(dq) / len(dq), min(dq), max(dq)
+    print(f"{'deque + re-scan (O(window))':<32} {len(rescan) / (time.perf_counter() - start):>12,.0f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Streaming window stats and heavy hitters")
+    parser.add_argument('--events', type=int, default=100_000_000)
+    args = parser.parse_args()
+    check()
+    print()
+    benchmark(args.events)
@@ -0,0 +1,331 @@
+'''
+Layered configuration with ChainMap's read API and flattened lookups.
+
+ChainMap(user_config, default_config) from D05_collections walks every
+layer on each config[key], which adds up with 6-10 layers and lookups on
+every request. LayeredConfig keeps the same interface (config[key], get,
+in, keys/items, maps, new_child, parents), but reads come from one
+flattened dict:
+
+- layers are Layer dicts that count their own changes (version) and tell
+  the configs built on them, so a layer change only marks the flat dict
+  stale; it is rebuilt on the next read;
+- new_child() returns a ConfigScope: an empty Layer on top of the parent,
+  created in O(1) and never copying the parent. Reads check the scope's
+  own keys, then fall through to the parent's flat dict;
+- resolve() returns a Setting with the value and the layer it came from.
+  Setting uses __slots__ rather than a namedtuple, which makes it cheaper
+  to create and to read attributes from.
+
+Plain dicts passed in are copied into Layers; change them through the
+config or config.maps[i] so the change is seen.
+'''
+
+from collections import ChainMap
+from collections.abc import MutableMapping
+from types import MappingProxyType
+import argparse
+import time
+import weakref
+
+class Layer(dict):
+    """A dict that bumps .version and invalidates dependent configs on every change"""
+    __slots__ = ('version', '_watchers')
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.version = 0
+        self._watchers = {}     # id(config) -> weakref; configs are unhashable mappings
+
+    def _watch(self, config):
+        key = id(config)
+        self._watchers[key] = weakref.ref(config, lambda _: self._watchers.pop(key, None))
+
+    def _changed(self):
+        self.version += 1
+        for ref in list(self._watchers.values()):
+            config = ref()
+            if config is not None:
+                config._dirty = True
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self._changed()
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self._changed()
+
+    def __ior__(self, other):
+        super().update(other)
+        self._changed()
+        return self
+
+    def update(self, *args, **kwargs):
+        super().update(*args, **kwargs)
+        self._changed()
+
+    def setdefault(self, key, default=None):
+        if key in self:
+            return self[key]
+        self[key] = default
+        return default
+
+    def pop(self, key, *default):
+        value = super().pop(key, *default)
+        self._changed()
+        return value
+
+    def popitem(self):
+        item = super().popitem()
+        self._changed()
+        return item
+
+    def clear(self):
+        super().clear()
+        self._changed()
+
+    def __reduce__(self):
+        return (Layer, (dict(self),))
+
+class Setting:
+    """One resolved key: its value and the index of the layer that supplied it"""
+    __slots__ = ('key', 'value', 'layer')
+
+    def __init__(self, key, value, layer):
+        self.key = key
+        self.value = value
+        self.layer = layer
+
+    def __repr__(self):
+        return f"Setting(key={self.key!r}, value={self.value!r}, layer={self.layer})"
+
+def _as_layer(mapping):
+    return mapping if isinstance(mapping, Layer) else Layer(mapping)
+
+class LayeredConfig(MutableMapping):
+    """
+    ChainMap-compatible view over layers (first wins) that answers lookups
+    from a cached flat dict, rebuilt only after one of its layers changes.
+    Writes and deletes go to the first layer, as with ChainMap.
+    """
+    __slots__ = ('maps', '_flat', '_dirty', '_versions', '__weakref__')
+
+    def __init__(self, *maps):
+        self.maps = tuple(_as_layer(m) for m in maps) or (Layer(),)
+        for layer in self.maps:
+            layer._watch(self)
+        self._flat = {}
+        self._dirty = True
+        self._versions = None
+
+    def _compile(self):
+        # Clear the flag first: a layer changed while we build sets it again
+        self._dirty = False
+        versions = tuple(layer.version for layer in self.maps)
+        flat = {}
+        for layer in reversed(self.maps):
+            flat.update(layer)
+        self._flat = flat
+        self._versions = versions
+        return flat
+
+    @property
+    def versions(self):
+        """Layer version counters the current flat dict was built from"""
+        if self._dirty:
+            self._compile()
+        return self._versions
+
+    def snapshot(self):
+        """Read-only flat view, for hot loops that want plain dict lookups; stale after a layer change"""
+        return MappingProxyType(self._compile() if self._dirty else self._flat)
+
+    def __getitem__(self, key):
+        flat = self._compile() if self._dirty else self._flat
+        try:
+            return flat[key]
+        except KeyError:
+            return self.__missing__(key)
+
+    def __missing__(self, key):
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        return (self._compile() if self._dirty else self._flat).get(key, default)
+
+    def __contains__(self, key):
+        return key in (self._compile() if self._dirty else self._flat)
+
+    def __iter__(self):
+        return iter(self._compile() if self._dirty else self._flat)
+
+    def __len__(self):
+        return len(self._compile() if self._dirty else self._flat)
+
+    def __bool__(self):
+        return any(self.maps)
+
+    def __setitem__(self, key, value):
+        self.maps[0][key] = value
+
+    def __delitem__(self, key):
+        try:
+            del self.maps[0][key]
+        except KeyError:
+            raise KeyError(f"Key not found in the first mapping: {key!r}")
+
+    def resolve(self, key):
+        """Setting(key, value, layer index) for the layer that wins, like ChainMap's lookup order"""
+        for i, layer in enumerate(self.maps):
+            if key in layer:
+                return Setting(key, layer[key], i)
+        return self.__missing__(key)
+
+    def new_child(self, m=None, **kwargs):
+        """Copy-on-write scope with m (or a fresh empty layer) in front; the parent is not copied"""
+        layer = _as_layer({} if m is None else m)
+        if kwargs:
+            layer.update(kwargs)
+        return ConfigScope(layer, self)
+
+    @property
+    def parents(self):
+        return LayeredConfig(*self.maps[1:])
+
+    def copy(self):
+        """Like ChainMap.copy(): a shallow copy of the first layer, the rest shared"""
+        return type(self)(self.maps[0].copy(), *self.maps[1:])
+
+    __copy__ = copy
+
+    def __repr__(self):
+        return f"{type(self).__name__}({', '.join(map(repr, self.maps))})"
+
+class ConfigScope(LayeredConfig):
+    """
+    A per-request layer over a parent config. Creating one allocates a
+    single small dict; lookups hit the scope's own layer and then the
+    parent's flat dict, so nothing is flattened unless you ask for a
+    snapshot().
+    """
+    __slots__ = ('top', 'parent')
+
+    def __init__(self, top, parent):
+        self.top = top
+        self.parent = parent
+        self.maps = (top,) + parent.maps
+        self._dirty = True
+        self._flat = None
+        self._versions = None
+
+    def _compile(self):
+        base = self.parent._compile() if self.parent._dirty else self.parent._flat
+        return {**base, **self.top} if self.top else base
+
+    @property
+    def versions(self):
+        return (self.top.version,) + self.parent.versions
+
+    def snapshot(self):
+        return MappingProxyType(self._compile())
+
+    def __getitem__(self, key):
+        top = self.top
+        if key in top:
+            return top[key]
+        return self.parent[key]
+
+    def get(self, key, default=None):
+        top = self.top
+        if key in top:
+            return top[key]
+        return self.parent.get(key, default)
+
+    def __contains__(self, key):
+        return key in self.top or key in self.parent
+
+    def __iter__(self):
+        return iter(self._compile())
+
+    def __len__(self):
+        return len(self._compile())
+
+    @property
+    def parents(self):
+        return self.parent
+
+    def copy(self):
+        return ConfigScope(Layer(self.top), self.parent)
+
+    __copy__ = copy
+
+# Benchmark
+
+def _layers(n_layers, keys_per_layer=50):
+    """Layer 0 is the most specific; the last layer (defaults) defines every key"""
+    layers = []
+    for i in range(n_layers):
+        if i == n_layers - 1:
+            layers.append({f"key{k}": ('default', k) for k in range(keys_per_layer * n_layers)})
+        else:
+            layers.append({f"key{k}": (i, k) for k in range(i * keys_per_layer, (i + 1) * keys_per_layer, 3)})
+    return layers
+
+def benchmark(layer_counts=(2, 5, 10), lookups=1_000_000, request_lookups=20):
+    """
+    lookups/sec versus ChainMap at each depth, for a long-lived config and
+    for a per-request child scope (new_child + request_lookups reads)
+    """
+    print(f"{'layers':>6} {'ChainMap':>12} {'Layered':>12} {'snapshot':>12} "
+          f"{'ChainMap req':>13} {'scope req':>12}   (lookups/s)")
+    for n in layer_counts:
+        dicts = _layers(n)
+        chain = ChainMap(*dicts)
+        config = LayeredConfig(*dicts)
+        keys = list(chain)
+        probe = (keys * (lookups // len(keys) + 1))[:lookups]
+        assert all(chain[k] == config[k] for k in keys)
+
+        def timed(fn):
+            start = time.perf_counter()
+            fn()
+            return lookups / (time.perf_counter() - start)
+
+        def read_all(mapping):
+            def run():
+                for k in probe:
+                    mapping[k]
+            return run
+
+        snap = config.snapshot()
+        requests = lookups // request_lookups
+
+        def per_request(make):
+            def run():
+                for r in range(requests):
+                    scope = make()
+                    scope['request_id'] = r
+                    for k in probe[r % 50:r % 50 + request_lookups]:
+                        scope[k]
+            return run
+
+        print(f"{n:>6} {timed(read_all(chain)):>12,.0f} {timed(read_all(config)):>12,.0f} "
+              f"{timed(read_all(snap)):>12,.0f} {timed(per_request(chain.new_child)):>13,.0f} "
+              f"{timed(per_request(config.new_child)):>12,.0f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Layered config vs ChainMap")
+    parser.add_argument('--lookups', type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    user_config = {'theme': 'dark', 'lang': 'en'}
+    default_config = {'theme': 'light', 'lang': 'en', 'timeout': 30}
+    config = LayeredConfig(user_config, default_config)
+    print(f"Theme: {config['theme']}")             # 'dark' (user overrides default)
+    request = config.new_child(timeout=5)
+    print(f"Request timeout: {request['timeout']}, global: {config['timeout']}")
+    config.maps[1]['timeout'] = 60                  # a default changes; the flat dict is rebuilt lazily
+    print(f"After default change: {config['timeout']} ({config.resolve('timeout')})")
+    print()
+    benchmark(lookups=args.lookups)
@@ -0,0 +1,269 @@
+'''
+Non-blocking logging setup built around the D07 RichHandler example.
+
+logger.info() on the calling thread only builds a LogRecord and drops it on
+an in-memory queue. A listener thread drains the queue in batches and hands
+them to the sinks: Rich for the console and a compact JSON-lines file, each
+written with one write() per batch. Under pressure DEBUG records are sampled
+and then dropped, with counters, while INFO and above are always delivered.
+
+Use %-style arguments (logger.debug("x=%s", x)) rather than f-strings: the
+logger level check runs before any formatting, and messages whose args are
+all plain str/int/float/bool/bytes/None are formatted on the listener thread,
+not the caller's. Any other args (dicts, lists, objects with their own
+__repr__) are merged into the message before the record is queued, so the
+log shows their value at the time of the call and formatting errors surface
+on the calling thread.
+'''
+
+from logging.handlers import QueueHandler
+import io
+import json
+import logging
+import queue
+import threading
+import time
+
+from rich.console import Console
+from rich.logging import RichHandler
+
+_IMMUTABLE_ARGS = frozenset({str, int, float, bool, bytes, type(None)})
+_EXC_FORMATTER = logging.Formatter()
+
+class PressureQueueHandler(QueueHandler):
+    """
+    QueueHandler that defers formatting to the listener when it is safe to,
+    and sheds DEBUG load: once the queue is fuller than high_watermark only 1 in
+    debug_sample_rate DEBUG records is kept, and a full queue drops DEBUG
+    outright. Records at INFO and above wait for space instead of being lost.
+    """
+    def __init__(self, q, high_watermark=0.8, debug_sample_rate=10):
+        super().__init__(q)
+        self.high_watermark = int(q.maxsize * high_watermark) if q.maxsize > 0 else None
+        self.debug_sample_rate = debug_sample_rate
+        self._debug_seen = 0
+        self.enqueued = 0
+        self.debug_sampled_out = 0
+        self.debug_dropped = 0
+        self.blocked = 0
+
+    def prepare(self, record):
+        # Deferring msg % args is only safe when nothing can change or fail in
+        # between; otherwise merge now, as QueueHandler.prepare does
+        args = record.args
+        if not isinstance(record.msg, str) or (args and not (
+                type(args) is tuple and all(type(a) in _IMMUTABLE_ARGS for a in args))):
+            record.msg = record.getMessage()
+            record.args = None
+        if record.exc_info:
+            record.exc_text = _EXC_FORMATTER.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        if record.levelno <= logging.DEBUG:
+            if self.high_watermark is not None and self.queue.qsize() >= self.high_watermark:
+                self._debug_seen += 1
+                if self._debug_seen % self.debug_sample_rate:
+                    self.debug_sampled_out += 1
+                    return
+            try:
+                self.queue.put_nowait(record)
+            except queue.Full:
+                self.debug_dropped += 1
+                return
+        else:
+            try:
+                self.queue.put_nowait(record)
+            except queue.Full:
+                self.blocked += 1
+                self.queue.put(record)
+        self.enqueued += 1
+
+    def counters(self):
+        return {'enqueued': self.enqueued, 'debug_sampled_out': self.debug_sampled_out,
+                'debug_dropped': self.debug_dropped, 'blocked': self.blocked}
+
+class JsonLinesHandler(logging.Handler):
+    """One compact JSON object per record; emit_batch writes a whole batch at once"""
+    def __init__(self, path, level=logging.NOTSET):
+        super().__init__(level)
+        self.stream = open(path, 'a', encoding='utf-8', buffering=1 << 16)
+
+    def to_json(self, record):
+        entry = {'ts': record.created, 'level': record.levelname, 'logger': record.name,
+                 'msg': record.getMessage(), 'thread': record.threadName}
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        elif record.exc_info:
+            entry['exc'] = _EXC_FORMATTER.formatException(record.exc_info)
+        return json.dumps(entry, separators=(',', ':'), default=str)
+
+    def emit(self, record):
+        self.emit_batch([record])
+
+    def emit_batch(self, records):
+        try:
+            self.stream.write(''.join(self.to_json(r) + '\n' for r in records))
+            self.stream.flush()
+        except Exception:
+            for r in records:
+                self.handleError(r)
+
+    def close(self):
+        try:
+            self.stream.close()
+        finally:
+            super().close()
+
+class BatchingListener:
+    """
+    Drains the queue on a daemon thread, up to batch_size records or
+    flush_interval seconds at a time, and passes each batch to every handler
+    (emit_batch when the handler has it, per-record handle() otherwise).
+    """
+    _STOP = object()
+
+    def __init__(self, q, handlers, batch_size=256, flush_interval=0.2):
+        self.queue = q
+        self.handlers = handlers
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.batches = 0
+        self.records = 0
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='log-listener', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Flush everything still queued, then stop the thread"""
+        if self._thread is not None:
+            self.queue.put(self._STOP)
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size and batch[-1] is not self._STOP:
+                try:
+                    batch.append(self.queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            stopping = batch[-1] is self._STOP
+            if stopping:
+                batch.pop()
+            if batch:
+                self._dispatch(batch)
+            if stopping:
+                return
+
+    def _dispatch(self, batch):
+        self.batches += 1
+        self.records += len(batch)
+        for handler in self.handlers:
+            records = [r for r in batch if r.levelno >= handler.level]
+            if not records:
+                continue
+            if hasattr(handler, 'emit_batch'):
+                handler.emit_batch(records)
+            else:
+                for r in records:
+                    handler.handle(r)
+
+class LoggingPipeline:
+    """What setup_logging returns: call stop() at shutdown to flush the sinks"""
+    def __init__(self, queue_handler, listener, handlers, logger):
+        self.queue_handler = queue_handler
+        self.listener = listener
+        self.handlers = handlers
+        self.logger = logger
+
+    def counters(self):
+        return {**self.queue_handler.counters(),
+                'batches': self.listener.batches, 'written': self.listener.records}
+
+    def stop(self):
+        self.listener.stop()
+        self.logger.removeHandler(self.queue_handler)
+        for handler in self.handlers:
+            handler.close()
+
+def setup_logging(level=logging.INFO, console_level=None, jsonl_path=None, logger_name=None,
+                  queue_size=10_000, batch_size=256, flush_interval=0.2,
+                  high_watermark=0.8, debug_sample_rate=10, console=None):
+    """
+    Put a bounded queue in front of a RichHandler console sink (and a JSON
+    lines file sink if jsonl_path is given) on the root logger, or on
+    logger_name. `level` is set on the logger itself, so disabled calls
+    return before a record is even created.
+    """
+    logger = logging.getLogger(logger_name)
+    q = queue.Queue(maxsize=queue_size)
+
+    rich = RichHandler(rich_tracebacks=True, console=console, level=console_level or level)
+    rich.setFormatter(logging.Formatter("%(message)s", datefmt="[%X]"))
+    handlers = [rich]
+    if jsonl_path:
+        handlers.append(JsonLinesHandler(jsonl_path, level=level))
+
+    queue_handler = PressureQueueHandler(q, high_watermark, debug_sample_rate)
+    listener = BatchingListener(q, handlers, batch_size, flush_interval)
+    listener.start()
+
+    logger.handlers[:] = [queue_handler]
+    logger.setLevel(level)
+    return LoggingPipeline(queue_handler, listener, handlers, logger)
+
+def benchmark(n=20_000):
+    """logger.info calls/sec on the caller's thread: direct RichHandler vs the queued pipeline"""
+    def rich_console():
+        return Console(file=io.StringIO(), width=120, force_terminal=False)
+
+    logger = logging.getLogger('bench')
+    logger.propagate = False
+
+    direct = RichHandler(rich_tracebacks=True, console=rich_console())
+    logger.handlers[:] = [direct]
+    logger.setLevel(logging.INFO)
+    start = time.perf_counter()
+    for i in range(n):
+        logger.info("request %d handled in %.2f ms", i, 1.5)
+    direct_time = time.perf_counter() - start
+
+    pipeline = setup_logging(logging.INFO, logger_name='bench', console=rich_console(), queue_size=n + 1)
+    start = time.perf_counter()
+    for i in range(n):
+        logger.info("request %d handled in %.2f ms", i, 1.5)
+    queued_time = time.perf_counter() - start
+    pipeline.stop()
+    drain_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for i in range(n):
+        logger.debug("disabled %s", i)
+    disabled_time = time.perf_counter() - start
+
+    print(f"{'setup':<28} {'calls/s':>12}")
+    print(f"{'direct RichHandler':<28} {n/direct_time:>12,.0f}")
+    print(f"{'queued (caller thread)':<28} {n/queued_time:>12,.0f}")
+    print(f"{'queued (incl. drain)':<28} {n/drain_time:>12,.0f}")
+    print(f"{'disabled DEBUG':<28} {n/disabled_time:>12,.0f}")
+    print(f"Pipeline counters: {pipeline.counters()}")
+
+if __name__ == "__main__":
+    pipeline = setup_logging(logging.INFO, jsonl_path='app_log.jsonl')
+    logger = logging.getLogger()
+
+    logger.debug("🔍 This DEBUG message won’t show (level is INFO)")
+    logger.info("ℹ️  This is an info message")
+    logger.warning("⚠️  This is a warning")
+    logger.error("❌  This is an error")
+    logger.critical("💥  Critical failure!")
+    pipeline.stop()
+
+    print("\n⚡ Logging throughput:")
+    benchmark()
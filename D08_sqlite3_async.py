@@ -0,0 +1,234 @@
+'''
+Asyncio front-end for the D08 users store.
+
+sqlite3 calls block, so AsyncUserStore never runs them on the event loop:
+reads go to a thread pool sized to UserStore's read connections, writes to
+a single writer thread. Two things keep the threads from becoming the
+bottleneck under heavy concurrency:
+
+- identical reads already in flight are coalesced; a thousand coroutines
+  asking for user 42 at once share one SELECT. A read is only shared if it
+  started after the last write finished, so writes stay visible to readers;
+- writes queue up, and each loop tick's worth is applied in a single
+  transaction, so one commit covers many update_email/delete_user calls.
+
+Run the module for a load test with thousands of concurrent coroutines.
+'''
+
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import asyncio
+import random
+import sqlite3
+import tempfile
+import time
+from pathlib import Path
+
+from D08_sqlite3_store import SQL_DELETE, SQL_UPDATE_EMAIL, SQL_UPSERT, UserStore
+
+class AsyncUserStore:
+    """
+    Async get_user / update_email / delete_user / upsert_many over a
+    UserStore. coalesce_reads and batch_writes can be switched off to
+    measure what they buy. Use `async with` or await close().
+    """
+    def __init__(self, path, readers=4, coalesce_reads=True, batch_writes=True, max_batch=5000):
+        self.store = UserStore(path, readers=readers)
+        self.coalesce_reads = coalesce_reads
+        self.batch_writes = batch_writes
+        self.max_batch = max_batch
+        self._read_pool = ThreadPoolExecutor(readers, thread_name_prefix='sqlite-read')
+        self._write_pool = ThreadPoolExecutor(1, thread_name_prefix='sqlite-write')
+        self._inflight = {}         # key -> (write generation at start, future)
+        self._write_generation = 0  # bumped as each write batch finishes
+        self._pending = []
+        self._flusher = None
+        self.stats = {'reads': 0, 'coalesced': 0, 'writes': 0, 'transactions': 0}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def close(self):
+        """Wait for queued writes, then shut the threads and connections down"""
+        if self._flusher is not None:
+            await self._flusher
+        # shutdown() and close() block until running queries finish; keep them off the loop
+        await asyncio.get_running_loop().run_in_executor(None, self._shutdown)
+
+    def _shutdown(self):
+        self._read_pool.shutdown()
+        self._write_pool.shutdown()
+        self.store.close()
+
+    # Reads
+
+    async def _read(self, key, fn, *args):
+        self.stats['reads'] += 1
+        loop = asyncio.get_running_loop()
+        if not self.coalesce_reads:
+            return await loop.run_in_executor(self._read_pool, fn, *args)
+        entry = self._inflight.get(key)
+        # Only join a read that started after the last finished write, so a
+        # caller never sees data older than a write it already awaited
+        if entry is not None and entry[0] == self._write_generation:
+            future = entry[1]
+            self.stats['coalesced'] += 1
+        else:
+            future = loop.run_in_executor(self._read_pool, fn, *args)
+            entry = (self._write_generation, future)
+            self._inflight[key] = entry
+            future.add_done_callback(lambda _, entry=entry: self._inflight.get(key) is entry
+                                     and self._inflight.pop(key))
+        # shield: one caller being cancelled must not cancel the shared query
+        return await asyncio.shield(future)
+
+    async def get_user(self, user_id):
+        return await self._read(('get_user', user_id), self.store.get_user, user_id)
+
+    async def find_by_name(self, name):
+        return await self._read(('find_by_name', name), self.store.find_by_name, name)
+
+    # Writes
+
+    async def _write(self, sql, args, many=False):
+        self.stats['writes'] += 1
+        loop = asyncio.get_running_loop()
+        if not self.batch_writes:
+            try:
+                return await loop.run_in_executor(self._write_pool, self._apply, [(sql, args, many, None)])
+            finally:
+                self._write_generation += 1
+        future = loop.create_future()
+        self._pending.append((sql, args, many, future))
+        if self._flusher is None:
+            self._flusher = asyncio.ensure_future(self._flush())
+        return await future
+
+    async def _flush(self):
+        loop = asyncio.get_running_loop()
+        try:
+            # Let every coroutine runnable this tick queue its write first
+            await asyncio.sleep(0)
+            while self._pending:
+                batch, self._pending = self._pending[:self.max_batch], self._pending[self.max_batch:]
+                try:
+                    outcomes = await loop.run_in_executor(self._write_pool, self._apply, batch)
+                except Exception as exc:
+                    # The transaction itself failed; nothing in the batch was applied
+                    outcomes = [(False, exc)] * len(batch)
+                self._write_generation += 1
+                for (_, _, _, future), (ok, value) in zip(batch, outcomes):
+                    if future.done():
+                        continue
+                    if ok:
+                        future.set_result(value)
+                    else:
+                        future.set_exception(value)
+        finally:
+            self._flusher = None
+
+    def _apply(self, batch):
+        """
+        Run on the writer thread: one transaction for the whole batch, with
+        a savepoint per item, so a failing call is rolled back completely
+        (every row of an upsert_many) and only fails its own caller; the
+        rest still commit. Returns (ok, result-or-exception) per item;
+        unbatched calls get the result directly.
+        """
+        outcomes = []
+        self.stats['transactions'] += 1
+        with self.store.transaction() as conn:
+            for sql, args, many, _ in batch:
+                conn.execute('SAVEPOINT item')
+                try:
+                    cur = conn.executemany(sql, args) if many else conn.execute(sql, args)
+                    outcomes.append((True, cur.rowcount if many else cur.rowcount > 0))
+                except sqlite3.Error as exc:
+                    conn.execute('ROLLBACK TO item')
+                    outcomes.append((False, exc))
+                conn.execute('RELEASE item')
+        if batch[0][3] is None:
+            ok, value = outcomes[0]
+            if not ok:
+                raise value
+            return value
+        return outcomes
+
+    async def update_email(self, user_id, email):
+        """Returns True if the user existed"""
+        return await self._write(SQL_UPDATE_EMAIL, (email, user_id))
+
+    async def delete_user(self, user_id):
+        """Returns True if the user existed"""
+        return await self._write(SQL_DELETE, (user_id,))
+
+    async def upsert_many(self, rows):
+        """Insert or update (id, name, email) rows; returns the number of rows written"""
+        return await self._write(SQL_UPSERT, list(rows), many=True)
+
+# Load test
+
+def _percentile(sorted_values, q):
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+async def load_test(path, users=100_000, coroutines=5000, ops_per_coroutine=20,
+                    write_ratio=0.2, hot_keys=1000, **options):
+    """
+    `coroutines` concurrent clients each do ops_per_coroutine operations:
+    reads of a hot key set (so identical reads overlap) with write_ratio of
+    update_email calls. Returns throughput and latency percentiles.
+    """
+    latencies = []
+    async with AsyncUserStore(path, **options) as store:
+        await store.upsert_many((i, f"user{i}", f"user{i}@example.com") for i in range(1, users + 1))
+
+        async def client(seed):
+            rng = random.Random(seed)
+            for _ in range(ops_per_coroutine):
+                user_id = rng.randrange(1, hot_keys + 1)
+                start = time.perf_counter()
+                if rng.random() < write_ratio:
+                    await store.update_email(user_id, f"{seed}@example.com")
+                else:
+                    await store.get_user(user_id)
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(client(i) for i in range(coroutines)))
+        elapsed = time.perf_counter() - start
+        stats = dict(store.stats)
+
+    latencies.sort()
+    return {
+        'ops': len(latencies), 'seconds': elapsed, 'ops_per_s': len(latencies) / elapsed,
+        'p50_ms': 1000 * _percentile(latencies, 0.50),
+        'p99_ms': 1000 * _percentile(latencies, 0.99),
+        'p999_ms': 1000 * _percentile(latencies, 0.999),
+        **stats,
+    }
+
+def benchmark(coroutines=5000, ops_per_coroutine=20):
+    configs = [
+        ('plain executor', {'coalesce_reads': False, 'batch_writes': False}),
+        ('coalesced reads', {'coalesce_reads': True, 'batch_writes': False}),
+        ('coalesce + batch', {'coalesce_reads': True, 'batch_writes': True}),
+    ]
+    print(f"{coroutines:,} coroutines x {ops_per_coroutine} ops (20% writes)")
+    print(f"{'config':<18} {'ops/s':>10} {'p50 ms':>8} {'p99 ms':>8} {'p99.9 ms':>9} "
+          f"{'coalesced':>10} {'txns':>7}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for i, (label, options) in enumerate(configs):
+            r = asyncio.run(load_test(str(Path(tmp) / f"users{i}.db"), coroutines=coroutines,
+                                      ops_per_coroutine=ops_per_coroutine, **options))
+            print(f"{label:<18} {r['ops_per_s']:>10,.0f} {r['p50_ms']:>8.1f} {r['p99_ms']:>8.1f} "
+                  f"{r['p999_ms']:>9.1f} {r['coalesced']:>10,} {r['transactions']:>7,}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the asyncio users store")
+    parser.add_argument('--coroutines', type=int, default=5000)
+    parser.add_argument('--ops', type=int, default=20)
+    args = parser.parse_args()
+    benchmark(args.coroutines, args.ops)
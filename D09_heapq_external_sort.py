@@ -0,0 +1,259 @@
+'''
+External k-way merge sort built on heapq.merge, for files larger than RAM.
+
+D09_heapq merges three small lists. external_sort() scales that to
+multi-GB log and CSV files:
+
+1. The input is split into byte ranges of about chunk_bytes, aligned to
+   line breaks. Each range is read, sorted in memory and written to a
+   temporary run file. With workers > 1 the ranges are sorted in parallel
+   processes, each reading its own range, so lines are never pickled
+   between processes.
+2. The runs are streamed through heapq.merge with large read and write
+   buffers. When there are more than fan_in runs, groups of fan_in are
+   first merged into longer runs, so the number of open files stays bounded.
+
+Key functions are supported; with workers > 1 they must be picklable
+(module level, or FieldKey for CSV columns). top_k() answers
+nlargest/nsmallest questions in one pass with O(k) memory and no sort.
+The result matches sorted(lines, key=key, reverse=reverse), including
+stability.
+
+Usage:
+    python D09_heapq_external_sort.py sort big.log sorted.log --workers 4
+    python D09_heapq_external_sort.py sort data.csv out.csv --header --column 2 --numeric
+    python D09_heapq_external_sort.py top data.csv -k 10 --header --column 2 --numeric
+    python D09_heapq_external_sort.py bench --lines 1000000
+'''
+
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import argparse
+import heapq
+import json
+import os
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+BUFFER = 1 << 20
+
+class FieldKey:
+    """Picklable key: the column-th field of a delimited line, optionally as a float"""
+    def __init__(self, column, sep=',', numeric=False):
+        self.column = column
+        self.sep = sep
+        self.numeric = numeric
+
+    def __call__(self, line):
+        field = line.rstrip('\r\n').split(self.sep)[self.column]
+        return float(field) if self.numeric else field
+
+def _ensure_newline(line):
+    return line if line.endswith('\n') else line + '\n'
+
+def split_ranges(path, chunk_bytes, start=0):
+    """(start, end) byte ranges of about chunk_bytes that begin and end on line breaks"""
+    size = os.path.getsize(path)
+    ranges = []
+    with open(path, 'rb') as f:
+        while start < size:
+            end = start + chunk_bytes
+            if end < size:
+                f.seek(end)
+                f.readline()
+                end = f.tell()
+            end = min(end, size)
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+def _sort_range(args):
+    """Sort one byte range of the input into a run file; runs in a worker process"""
+    path, start, end, key, reverse, run_path, encoding = args
+    with open(path, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    # Split on '\n' only, as file iteration does (str.splitlines also breaks on \r, \x1c, ...)
+    lines = [line + '\n' for line in data.decode(encoding).split('\n')]
+    if data.endswith(b'\n'):
+        lines.pop()
+    lines.sort(key=key, reverse=reverse)
+    with open(run_path, 'w', encoding=encoding, newline='', buffering=BUFFER) as out:
+        out.writelines(lines)
+    return run_path
+
+def _merge_files(paths, out_path, key, reverse, encoding):
+    files = [open(p, encoding=encoding, newline='', buffering=BUFFER) for p in paths]
+    try:
+        with open(out_path, 'w', encoding=encoding, newline='', buffering=BUFFER) as out:
+            out.writelines(heapq.merge(*files, key=key, reverse=reverse))
+    finally:
+        for f in files:
+            f.close()
+
+def external_sort(src, dst, key=None, reverse=False, chunk_bytes=64 << 20, fan_in=64,
+                  workers=1, header=False, tmp_dir=None, encoding='utf-8'):
+    """
+    Sort the lines of src into dst using at most about chunk_bytes of lines
+    in memory per process. header=True keeps the first line in place.
+    Returns a dict with the number of runs and merge passes.
+    """
+    if fan_in < 2:
+        raise ValueError("fan_in must be at least 2")
+    with tempfile.TemporaryDirectory(dir=tmp_dir, prefix='extsort-') as tmp:
+        head, body_start = '', 0
+        if header:
+            with open(src, 'rb') as f:
+                head = _ensure_newline(f.readline().decode(encoding))
+                body_start = f.tell()
+        ranges = split_ranges(src, chunk_bytes, body_start)
+        tasks = [(str(src), start, end, key, reverse, os.path.join(tmp, f"run-0-{i:06d}"), encoding)
+                 for i, (start, end) in enumerate(ranges)]
+        if workers > 1 and len(tasks) > 1:
+            with ProcessPoolExecutor(min(workers, len(tasks))) as pool:
+                runs = list(pool.map(_sort_range, tasks))
+        else:
+            runs = [_sort_range(t) for t in tasks]
+        stats = {'runs': len(runs), 'merge_passes': 0}
+
+        # Merge fan_in runs at a time until one pass can finish the job;
+        # groups stay in input order so equal keys keep their order
+        level = 1
+        while len(runs) > fan_in:
+            merged = []
+            for i in range(0, len(runs), fan_in):
+                group = runs[i:i + fan_in]
+                if len(group) == 1:
+                    merged.append(group[0])
+                    continue
+                out = os.path.join(tmp, f"run-{level}-{i // fan_in:06d}")
+                _merge_files(group, out, key, reverse, encoding)
+                for p in group:
+                    os.remove(p)
+                merged.append(out)
+            runs = merged
+            level += 1
+            stats['merge_passes'] += 1
+
+        with open(dst, 'w', encoding=encoding, newline='', buffering=BUFFER) as out:
+            out.write(head)
+        if len(runs) == 1:
+            with open(runs[0], 'rb') as f, open(dst, 'ab') as out:
+                shutil.copyfileobj(f, out, BUFFER)
+        elif runs:
+            final = os.path.join(tmp, 'final')
+            _merge_files(runs, final, key, reverse, encoding)
+            with open(final, 'rb') as f, open(dst, 'ab') as out:
+                shutil.copyfileobj(f, out, BUFFER)
+        stats['merge_passes'] += 1 if len(runs) > 1 else 0
+    return stats
+
+def top_k(src, k, key=None, largest=True, header=False, encoding='utf-8'):
+    """The k largest (or smallest) lines in one streaming pass, without sorting the file"""
+    with open(src, encoding=encoding, newline='', buffering=BUFFER) as f:
+        if header:
+            f.readline()
+        pick = heapq.nlargest if largest else heapq.nsmallest
+        return [line.rstrip('\r\n') for line in pick(k, f, key=key)]
+
+# Benchmark
+
+def generate_log(path, n_lines, seed=0):
+    """Log-like lines: '<timestamp>,<level>,<latency_ms>,<message>', in random order"""
+    rng = random.Random(seed)
+    levels = ['DEBUG', 'INFO', 'WARNING', 'ERROR']
+    with open(path, 'w', buffering=BUFFER) as f:
+        for i in range(n_lines):
+            f.write(f"{rng.randrange(1_700_000_000, 1_800_000_000)},{rng.choice(levels)},"
+                    f"{rng.random() * 1000:.3f},request {i} handled\n")
+    return path
+
+def _measure(mode, src, dst, workers, chunk_bytes):
+    """Run one sort; called in a fresh interpreter by benchmark()"""
+    start = time.perf_counter()
+    if mode == 'sorted':
+        with open(src, newline='') as f:
+            lines = f.readlines()
+        with open(dst, 'w', newline='') as out:
+            out.writelines(sorted(lines))
+    else:
+        external_sort(src, dst, workers=workers, chunk_bytes=chunk_bytes)
+    elapsed = time.perf_counter() - start
+    # ru_maxrss is KiB on Linux; RUSAGE_CHILDREN is the largest worker process
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    print(json.dumps({'seconds': elapsed, 'peak_rss': peak * 1024}))
+
+def benchmark(n_lines=1_000_000, chunk_bytes=8 << 20, workers=(1, 4)):
+    """Throughput and peak RSS of sorted() vs external_sort on a file that fits in memory"""
+    with tempfile.TemporaryDirectory() as tmp:
+        src = generate_log(os.path.join(tmp, 'input.log'), n_lines)
+        size = os.path.getsize(src)
+        print(f"{n_lines:,} lines, {size / 1e6:.0f} MB, runs of {chunk_bytes >> 20} MB")
+        print(f"{'method':<20} {'seconds':>8} {'MB/s':>7} {'peak RSS MB':>12}  (largest single process)")
+        reference = None
+        for mode, w in [('sorted', 1)] + [('external', w) for w in workers]:
+            dst = os.path.join(tmp, f"out-{mode}-{w}.log")
+            proc = subprocess.run([sys.executable, __file__, '_measure', mode, src, dst,
+                                   str(w), str(chunk_bytes)], capture_output=True, text=True, check=True)
+            result = json.loads(proc.stdout)
+            digest = Path(dst).read_bytes()
+            reference = reference or digest
+            assert digest == reference, f"{mode} output differs from sorted()"
+            label = 'sorted()' if mode == 'sorted' else f"external x{w}"
+            print(f"{label:<20} {result['seconds']:>8.2f} {size / 1e6 / result['seconds']:>7.1f} "
+                  f"{result['peak_rss'] / 1e6:>12.0f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="External merge sort for large text files")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    def key_args(p):
+        p.add_argument('--header', action='store_true', help="first line is a header")
+        p.add_argument('--column', type=int, help="sort by this delimited field (0-based)")
+        p.add_argument('--sep', default=',')
+        p.add_argument('--numeric', action='store_true')
+
+    sort = sub.add_parser('sort')
+    sort.add_argument('src')
+    sort.add_argument('dst')
+    sort.add_argument('--reverse', action='store_true')
+    sort.add_argument('--chunk-mb', type=int, default=64)
+    sort.add_argument('--fan-in', type=int, default=64)
+    sort.add_argument('--workers', type=int, default=1)
+    sort.add_argument('--tmp-dir')
+    key_args(sort)
+    top = sub.add_parser('top')
+    top.add_argument('src')
+    top.add_argument('-k', type=int, default=10)
+    top.add_argument('--smallest', action='store_true')
+    key_args(top)
+    bench = sub.add_parser('bench')
+    bench.add_argument('--lines', type=int, default=1_000_000)
+    bench.add_argument('--chunk-mb', type=int, default=8)
+    bench.add_argument('--workers', type=int, nargs='+', default=[1, 4])
+    measure = sub.add_parser('_measure')
+    measure.add_argument('mode')
+    measure.add_argument('src')
+    measure.add_argument('dst')
+    measure.add_argument('workers', type=int)
+    measure.add_argument('chunk_bytes', type=int)
+    args = parser.parse_args()
+
+    if args.command in ('sort', 'top'):
+        key = FieldKey(args.column, args.sep, args.numeric) if args.column is not None else None
+    if args.command == 'sort':
+        stats = external_sort(args.src, args.dst, key, args.reverse, args.chunk_mb << 20,
+                              args.fan_in, args.workers, args.header, args.tmp_dir)
+        print(f"Sorted {args.src} -> {args.dst}: {stats['runs']} runs, {stats['merge_passes']} merge passes")
+    elif args.command == 'top':
+        print('\n'.join(top_k(args.src, args.k, key, not args.smallest, args.header)))
+    elif args.command == 'bench':
+        benchmark(args.lines, args.chunk_mb << 20, args.workers)
+    else:
+        _measure(args.mode, args.src, args.dst, args.workers, args.chunk_bytes)
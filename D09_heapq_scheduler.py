@@ -0,0 +1,392 @@
+'''
+Indexed priority-queue scheduler extending the D09_heapq task example.
+
+D09 keeps (priority, task) tuples in a list: changing a priority or
+cancelling means an O(n) search plus heapify, and equal priorities fall
+back to comparing the task strings. IndexedHeap is a binary heap that also
+records where each item sits, so push, pop, update and remove are all
+O(log n). TaskScheduler builds on it with:
+
+- FIFO order among equal priorities (a submission counter in the key);
+- optional aging: a waiting task's effective priority drops by aging_rate
+  per second. The drop is the same for every task, so the heap key
+  priority + aging_rate * submit_time stays fixed;
+- optional deadlines: an overdue task is served before everything else;
+- a blocking get() and dispatch(), which feeds a thread or process pool.
+'''
+
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import heapq
+import itertools
+import random
+import threading
+import time
+
+class IndexedHeap:
+    """Min-heap of unique hashable items with a position index for O(log n) update/remove"""
+    __slots__ = ('_keys', '_items', '_pos')
+
+    def __init__(self):
+        self._keys = []
+        self._items = []
+        self._pos = {}
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, item):
+        return item in self._pos
+
+    def key(self, item):
+        return self._keys[self._pos[item]]
+
+    def peek(self):
+        return self._items[0], self._keys[0]
+
+    def push(self, item, key):
+        if item in self._pos:
+            raise KeyError(f"{item!r} is already queued")
+        self._keys.append(key)
+        self._items.append(item)
+        self._pos[item] = len(self._items) - 1
+        self._sift_up(len(self._items) - 1)
+
+    def pop(self):
+        """Remove and return (item, key) with the smallest key"""
+        if not self._items:
+            raise IndexError("pop from an empty heap")
+        item, key = self._items[0], self._keys[0]
+        self._delete(0)
+        return item, key
+
+    def update(self, item, key):
+        i = self._pos[item]
+        old = self._keys[i]
+        self._keys[i] = key
+        if key < old:
+            self._sift_up(i)
+        else:
+            self._sift_down(i)
+
+    def remove(self, item):
+        """Remove item and return its key"""
+        i = self._pos[item]
+        key = self._keys[i]
+        self._delete(i)
+        return key
+
+    def _delete(self, i):
+        keys, items, pos = self._keys, self._items, self._pos
+        del pos[items[i]]
+        last_key, last_item = keys.pop(), items.pop()
+        if i < len(items):
+            keys[i], items[i] = last_key, last_item
+            pos[last_item] = i
+            if i and last_key < keys[(i - 1) >> 1]:
+                self._sift_up(i)
+            else:
+                self._sift_down(i)
+
+    def _sift_up(self, i):
+        keys, items, pos = self._keys, self._items, self._pos
+        key, item = keys[i], items[i]
+        while i:
+            parent = (i - 1) >> 1
+            if key < keys[parent]:
+                keys[i], items[i] = keys[parent], items[parent]
+                pos[items[i]] = i
+                i = parent
+            else:
+                break
+        keys[i], items[i] = key, item
+        pos[item] = i
+
+    def _sift_down(self, i):
+        # As in heapq: walk the smaller child up all the way to a leaf, then
+        # sift the displaced item back up, which needs about half the compares
+        keys, items, pos = self._keys, self._items, self._pos
+        n = len(items)
+        key, item = keys[i], items[i]
+        start = i
+        child = 2 * i + 1
+        while child < n:
+            right = child + 1
+            if right < n and not keys[child] < keys[right]:
+                child = right
+            keys[i], items[i] = keys[child], items[child]
+            pos[items[i]] = i
+            i = child
+            child = 2 * i + 1
+        while i > start:
+            parent = (i - 1) >> 1
+            if key < keys[parent]:
+                keys[i], items[i] = keys[parent], items[parent]
+                pos[items[i]] = i
+                i = parent
+            else:
+                break
+        keys[i], items[i] = key, item
+        pos[item] = i
+
+class TaskScheduler:
+    """
+    Thread-safe priority scheduler; lower priority numbers run first, as in
+    D09. Tasks are identified by a hashable task_id and carry an optional
+    payload that is handed back by pop()/get().
+    """
+    def __init__(self, aging_rate=0.0, clock=time.monotonic):
+        self.aging_rate = aging_rate
+        self.clock = clock
+        self._heap = IndexedHeap()
+        self._deadlines = IndexedHeap()
+        self._tasks = {}          # task_id -> [priority, submitted, seq, payload]
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._ready = threading.Condition(self._lock)
+        self._closed = False
+
+    def __len__(self):
+        return len(self._heap)
+
+    def __contains__(self, task_id):
+        return task_id in self._heap
+
+    def _key(self, priority, submitted, seq):
+        if self.aging_rate:
+            return (priority + self.aging_rate * submitted, seq)
+        return (priority, seq)
+
+    def submit(self, task_id, priority, payload=None, deadline=None):
+        """Queue a task; deadline is an absolute time on the scheduler's clock"""
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("scheduler is closed")
+            seq = next(self._seq)
+            submitted = self.clock() if self.aging_rate else 0.0
+            self._heap.push(task_id, self._key(priority, submitted, seq))
+            if deadline is not None:
+                self._deadlines.push(task_id, (deadline, seq))
+            self._tasks[task_id] = [priority, submitted, seq, payload]
+            self._ready.notify()
+        return task_id
+
+    def update(self, task_id, priority):
+        """Change a queued task's priority; it keeps its place among equal priorities"""
+        with self._lock:
+            entry = self._tasks[task_id]
+            entry[0] = priority
+            self._heap.update(task_id, self._key(priority, entry[1], entry[2]))
+
+    def cancel(self, task_id):
+        """Drop a queued task; returns False if it was not queued"""
+        with self._lock:
+            if task_id not in self._tasks:
+                return False
+            self._forget(task_id)
+            return True
+
+    def _forget(self, task_id):
+        self._heap.remove(task_id)
+        if task_id in self._deadlines:
+            self._deadlines.remove(task_id)
+        return self._tasks.pop(task_id)[3]
+
+    def _pop(self):
+        if self._deadlines and self._deadlines.peek()[1][0] <= self.clock():
+            task_id = self._deadlines.peek()[0]
+        else:
+            task_id = self._heap.peek()[0]
+        return task_id, self._forget(task_id)
+
+    def pop(self):
+        """(task_id, payload) of the next task; overdue tasks come first, by deadline"""
+        with self._lock:
+            if not self._heap:
+                raise IndexError("pop from an empty scheduler")
+            return self._pop()
+
+    def get(self, timeout=None):
+        """Blocking pop; returns None once the scheduler is closed and drained, or on timeout"""
+        with self._ready:
+            if not self._ready.wait_for(lambda: self._heap or self._closed, timeout):
+                return None
+            return self._pop() if self._heap else None
+
+    def close(self):
+        """No more submissions; get() returns None after the queue drains"""
+        with self._ready:
+            self._closed = True
+            self._ready.notify_all()
+
+def dispatch(scheduler, fn, executor, max_in_flight=None, on_result=None):
+    """
+    Worker loop: take tasks in priority order and run fn(payload) on the
+    executor (thread or process pool), with at most max_in_flight queued
+    on it so priorities keep mattering. on_result(task_id, future) is
+    called as each finishes. Returns once the scheduler is closed and
+    everything has completed.
+    """
+    max_in_flight = max_in_flight or 2 * getattr(executor, '_max_workers', 4)
+    slots = threading.BoundedSemaphore(max_in_flight)
+    done = threading.Condition()
+    in_flight = 0
+
+    def finished(task_id, future):
+        nonlocal in_flight
+        try:
+            if on_result:
+                on_result(task_id, future)
+        finally:
+            slots.release()
+            with done:
+                in_flight -= 1
+                done.notify_all()
+
+    while True:
+        slots.acquire()
+        task = scheduler.get()
+        if task is None:
+            slots.release()
+            break
+        task_id, payload = task
+        with done:
+            in_flight += 1
+        try:
+            future = executor.submit(fn, payload)
+        except BaseException:
+            # Executor shut down or rejected the call: give the slot back so
+            # nothing waits on a task that will never finish
+            slots.release()
+            with done:
+                in_flight -= 1
+                done.notify_all()
+            raise
+        future.add_done_callback(lambda f, task_id=task_id: finished(task_id, f))
+    with done:
+        done.wait_for(lambda: in_flight == 0)
+
+# Benchmark against the D09 list + heapify approach
+
+class _ListScheduler:
+    """D09 approach: a heapified list of (priority, seq, task_id); update searches and re-heapifies"""
+    def __init__(self):
+        self.heap = []
+        self.seq = itertools.count()
+
+    def submit(self, task_id, priority):
+        heapq.heappush(self.heap, (priority, next(self.seq), task_id))
+
+    def update(self, task_id, priority):
+        for i, (_, seq, tid) in enumerate(self.heap):
+            if tid == task_id:
+                self.heap[i] = (priority, seq, tid)
+                heapq.heapify(self.heap)
+                return
+
+    def pop(self):
+        return heapq.heappop(self.heap)[2]
+
+class _LazyScheduler:
+    """The heapq-docs recipe: mark the old entry removed and push a new one"""
+    REMOVED = object()
+
+    def __init__(self):
+        self.heap = []
+        self.entries = {}
+        self.seq = itertools.count()
+        self.version = itertools.count()
+
+    def submit(self, task_id, priority, seq=None):
+        # the version field keeps a stale and a live entry from ever comparing task ids
+        seq = next(self.seq) if seq is None else seq
+        entry = [priority, seq, next(self.version), task_id]
+        self.entries[task_id] = entry
+        heapq.heappush(self.heap, entry)
+
+    def update(self, task_id, priority):
+        entry = self.entries.pop(task_id)
+        entry[3] = self.REMOVED
+        self.submit(task_id, priority, entry[1])
+
+    def pop(self):
+        while True:
+            task_id = heapq.heappop(self.heap)[3]
+            if task_id is not self.REMOVED:
+                del self.entries[task_id]
+                return task_id
+
+class _TaskIds(TaskScheduler):
+    def pop(self):
+        return super().pop()[0]
+
+def benchmark(n=1_000_000, update_ratio=0.1, list_sample=200, seed=0):
+    """
+    n submits, n * update_ratio random priority updates, then n pops. The
+    list + heapify baseline is O(n) per update, so its update time is
+    measured on list_sample updates and extrapolated.
+    """
+    rng = random.Random(seed)
+    priorities = [rng.randrange(100) for _ in range(n)]
+    updates = [(rng.randrange(n), rng.randrange(100)) for _ in range(int(n * update_ratio))]
+
+    def run(make, updates):
+        s = make()
+        t0 = time.perf_counter()
+        for i, p in enumerate(priorities):
+            s.submit(i, p)
+        t1 = time.perf_counter()
+        for i, p in updates:
+            s.update(i, p)
+        t2 = time.perf_counter()
+        pop = s.pop
+        order = [pop() for _ in range(n)]
+        t3 = time.perf_counter()
+        return t1 - t0, t2 - t1, t3 - t2, order
+
+    print(f"n = {n:,}, {len(updates):,} updates")
+    print(f"{'scheduler':<22} {'submit s':>9} {'update s':>10} {'pop s':>8} {'total s':>9}")
+    results = {}
+    for label, make in (('indexed heap', _TaskIds), ('heapq lazy delete', _LazyScheduler)):
+        submit, update, pop, order = run(make, updates)
+        results[label] = order
+        print(f"{label:<22} {submit:>9.2f} {update:>10.2f} {pop:>8.2f} {submit + update + pop:>9.2f}")
+    assert results['indexed heap'] == results['heapq lazy delete']
+
+    submit, update, pop, _ = run(_ListScheduler, updates[:list_sample])
+    update *= len(updates) / list_sample
+    print(f"{'list + heapify (D09)':<22} {submit:>9.2f} {update:>9.0f}* {pop:>8.2f} {submit + update + pop:>9.0f}")
+    print(f"* extrapolated from {list_sample} updates")
+
+def demo():
+    scheduler = TaskScheduler()
+    for priority, task in [(3, 'low priority'), (1, 'urgent'), (2, 'medium'), (1, 'also urgent')]:
+        scheduler.submit(task, priority)
+    scheduler.update('low priority', 0)
+    scheduler.cancel('medium')
+    while scheduler:
+        task, _ = scheduler.pop()
+        print(f"Processing: {task}")
+
+    # Feed a pool: fn gets the payload, results come back through on_result
+    scheduler = TaskScheduler(aging_rate=1.0)
+    results = []
+    with ThreadPoolExecutor(4) as pool:
+        worker = threading.Thread(target=dispatch, args=(scheduler, lambda x: x * x, pool),
+                                  kwargs={'on_result': lambda tid, f: results.append((tid, f.result()))})
+        worker.start()
+        for i in range(20):
+            scheduler.submit(f"job{i}", priority=i % 5, payload=i)
+        scheduler.close()
+        worker.join()
+    print(f"Pool ran {len(results)} jobs, first finished: {results[:3]}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Indexed priority-queue scheduler")
+    parser.add_argument('--bench', action='store_true', help="run the 1M-task benchmark")
+    parser.add_argument('--tasks', type=int, default=1_000_000)
+    args = parser.parse_args()
+    demo()
+    if args.bench:
+        print()
+        benchmark(args.tasks)
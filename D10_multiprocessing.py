@@ -1,29 +1,265 @@
 import logging
+from logging.handlers import QueueHandler, QueueListener
 
 
 import multiprocessing as mp
+import os
 import time
 
+import numpy as np
+
 def cpu_task(n):
     start = time.time()
     result = sum(i**2 for i in range(n))
     logging.info(f"Task {n} completed in {time.time()-start:.2f}s")
     return result
 
+# Sum of i**2 over [start, stop), three ways
+
+def squares_python(start, stop):
+    return sum(i**2 for i in range(start, stop))
+
+def squares_numpy(start, stop, block=1 << 20):
+    """
+    Vectorized and exact for values below 2**32: each uint64 square is split
+    into 32-bit halves whose per-block sums can't overflow, and the halves are
+    recombined as Python ints.
+    """
+    if stop > 1 << 32:
+        raise ValueError("squares_numpy is exact only for values below 2**32")
+    total = 0
+    for lo in range(start, stop, block):
+        values = np.arange(lo, min(lo + block, stop), dtype=np.uint64)
+        sq = values * values
+        total += (int((sq >> np.uint64(32)).sum()) << 32) + int((sq & np.uint64(0xFFFFFFFF)).sum())
+    return total
+
+def squares_closed(start, stop):
+    # sum_{i<n} i**2 = (n-1) n (2n-1) / 6
+    prefix = lambda n: (n - 1) * n * (2 * n - 1) // 6 if n > 0 else 0
+    return prefix(stop) - prefix(start)
+
+BACKENDS = {'python': squares_python, 'numpy': squares_numpy, 'closed': squares_closed}
+
+def _run_chunk(args):
+    backend, start, stop = args
+    return BACKENDS[backend](start, stop)
+
+# Worker logging: every process logs into one queue, the parent's listener does the I/O
+
+LOG_FORMAT = "%(asctime)s %(processName)-18s %(levelname)-7s %(message)s"
+
+def _init_worker(log_queue, level):
+    """Pool initializer: route the worker's root logger into the shared queue"""
+    root = logging.getLogger()
+    root.handlers[:] = [QueueHandler(log_queue)]
+    root.setLevel(level)
+
+class WorkerLogging:
+    """
+    Context manager that funnels log records from the parent and every pool
+    worker through one multiprocessing queue to a QueueListener thread in the
+    parent. Workers only enqueue records; formatting and terminal/file I/O
+    happen on the listener. Pass .queue and .level to ComputeEngine.
+    """
+    def __init__(self, level=logging.INFO, handlers=None):
+        self.level = level
+        self.queue = mp.Queue(-1)
+        if handlers is None:
+            handler = logging.StreamHandler()
+            handler.setFormatter(logging.Formatter(LOG_FORMAT))
+            handlers = [handler]
+        self.listener = QueueListener(self.queue, *handlers, respect_handler_level=True)
+        self._saved = None
+
+    def __enter__(self):
+        root = logging.getLogger()
+        self._saved = (root.handlers[:], root.level)
+        _init_worker(self.queue, self.level)
+        self.listener.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.listener.stop()
+        root = logging.getLogger()
+        root.handlers[:], level = self._saved
+        root.setLevel(level)
+
+# Per-task metrics, measured inside the worker and sent back with the result
+
+def _instrumented(args):
+    fn, task, submitted = args
+    started = time.time()
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    result = fn(task)
+    return result, {
+        'pid': os.getpid(),
+        'queue_wait': started - submitted,
+        'wall': time.perf_counter() - wall_start,
+        'cpu': time.process_time() - cpu_start,
+    }
+
+def metrics_summary(metrics):
+    """Aggregate per-task metrics into one row per worker pid"""
+    rows = {}
+    for m in metrics:
+        row = rows.setdefault(m['pid'], {'pid': m['pid'], 'tasks': 0, 'wall': 0.0, 'cpu': 0.0,
+                                         'queue_wait': 0.0, 'max_queue_wait': 0.0})
+        row['tasks'] += 1
+        row['wall'] += m['wall']
+        row['cpu'] += m['cpu']
+        row['queue_wait'] += m['queue_wait']
+        row['max_queue_wait'] = max(row['max_queue_wait'], m['queue_wait'])
+    return sorted(rows.values(), key=lambda r: r['pid'])
+
+def print_metrics_summary(metrics):
+    rows = metrics_summary(metrics)
+    if not rows:
+        return
+    print(f"{'pid':>8} {'tasks':>6} {'busy s':>8} {'cpu s':>8} {'avg wait s':>11} {'max wait s':>11}")
+    for r in rows:
+        print(f"{r['pid']:>8} {r['tasks']:>6} {r['wall']:>8.3f} {r['cpu']:>8.3f} "
+              f"{r['queue_wait']/r['tasks']:>11.3f} {r['max_queue_wait']:>11.3f}")
+    busy = [r['wall'] for r in rows]
+    # 1.00 means perfectly even work; higher means one worker carried more
+    print(f"Imbalance (max/mean busy): {max(busy) / (sum(busy) / len(busy)):.2f}")
+
+def partition(n, chunk_size):
+    """Split [0, n) into consecutive (start, stop) ranges of at most chunk_size"""
+    return [(lo, min(lo + chunk_size, n)) for lo in range(0, n, chunk_size)]
+
+class ComputeEngine:
+    """
+    Keeps one worker pool alive across calls and splits a single big range
+    across it. Use as a context manager (or call close()) to shut the pool down.
+    With log_queue (see WorkerLogging) workers log through the shared queue;
+    with instrument=True every task's wall/CPU time, pid and queue wait are
+    appended to .metrics.
+    """
+    def __init__(self, processes=None, target_chunk_seconds=0.05, min_chunks_per_process=4,
+                 log_queue=None, log_level=logging.INFO, instrument=False):
+        self.processes = processes or os.cpu_count()
+        self.log_queue = log_queue
+        self.log_level = log_level
+        self.instrument = instrument
+        self.metrics = []
+        self.target_chunk_seconds = target_chunk_seconds
+        self.min_chunks_per_process = min_chunks_per_process
+        self._pool = None
+        self._per_item = {}
+
+    @property
+    def pool(self):
+        if self._pool is None:
+            kwargs = {}
+            if self.log_queue is not None:
+                kwargs = {'initializer': _init_worker, 'initargs': (self.log_queue, self.log_level)}
+            self._pool = mp.Pool(processes=self.processes, **kwargs)
+            # Pay process start-up now rather than inside the first timed call
+            self._pool.map(abs, range(self.processes))
+        return self._pool
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def map(self, fn, tasks, chunksize=1):
+        if not self.instrument:
+            return self.pool.map(fn, tasks, chunksize)
+        submitted = time.time()
+        pairs = self.pool.map(_instrumented, [(fn, t, submitted) for t in tasks], chunksize)
+        self.metrics.extend(m for _, m in pairs)
+        return [r for r, _ in pairs]
+
+    def chunk_size(self, n, backend):
+        """
+        Pick a chunk size so each chunk runs for about target_chunk_seconds,
+        but with at least min_chunks_per_process chunks per worker so a slow
+        worker can be balanced out. Per-item cost is measured once per backend.
+        """
+        if backend not in self._per_item:
+            sample = 200_000
+            start = time.perf_counter()
+            BACKENDS[backend](0, sample)
+            self._per_item[backend] = (time.perf_counter() - start) / sample
+        by_time = int(self.target_chunk_seconds / max(self._per_item[backend], 1e-12))
+        by_balance = -(-n // (self.processes * self.min_chunks_per_process))
+        return max(1, min(by_time, by_balance))
+
+    def sum_squares(self, n, backend='python', chunk_size=None):
+        """sum(i**2 for i in range(n)), split into chunks across the pool"""
+        if backend == 'closed':
+            return squares_closed(0, n)
+        chunk_size = chunk_size or self.chunk_size(n, backend)
+        tasks = [(backend, lo, hi) for lo, hi in partition(n, chunk_size)]
+        if not self.instrument:
+            return sum(self.pool.imap_unordered(_run_chunk, tasks))
+        submitted = time.time()
+        total = 0
+        for result, metrics in self.pool.imap_unordered(_instrumented, [(_run_chunk, t, submitted) for t in tasks]):
+            total += result
+            self.metrics.append(metrics)
+        return total
+
+def scaling_report(n=50_000_000, core_counts=None, backends=('python', 'numpy')):
+    """
+    Time one sum over range(n) sequentially, on 1..N processes per backend,
+    and in closed form; print speedup and parallel efficiency per core count
+    so the scaling knee is visible.
+    """
+    core_counts = core_counts or sorted({1, 2, 4, os.cpu_count()})
+    expected = squares_closed(0, n)
+    print(f"n = {n:,}")
+    print(f"{'backend':<8} {'procs':>5} {'seconds':>9} {'speedup':>8} {'efficiency':>10}")
+    for backend in backends:
+        start = time.perf_counter()
+        assert BACKENDS[backend](0, n) == expected
+        sequential = time.perf_counter() - start
+        print(f"{backend:<8} {'seq':>5} {sequential:>9.3f} {1:>7.2f}x {'':>10}")
+        for procs in core_counts:
+            with ComputeEngine(procs) as engine:
+                engine.pool
+                start = time.perf_counter()
+                assert engine.sum_squares(n, backend) == expected
+                elapsed = time.perf_counter() - start
+            print(f"{backend:<8} {procs:>5} {elapsed:>9.3f} {sequential/elapsed:>7.2f}x "
+                  f"{sequential/elapsed/procs:>10.0%}")
+    start = time.perf_counter()
+    squares_closed(0, n)
+    print(f"{'closed':<8} {'-':>5} {time.perf_counter() - start:>9.6f}")
+
 if __name__ == "__main__":
-    tasks = [50000000] * 4
-    
-    # Sequential execution
-    start_time = time.time()
-    sequential_results = [cpu_task(n) for n in tasks]
-    sequential_time = time.time() - start_time
-    
-    # Parallel execution
-    start_time = time.time()
-    with mp.Pool(processes=4) as pool:
-        parallel_results = pool.map(cpu_task, tasks)
-    parallel_time = time.time() - start_time
-    
-    logging.info(f"Sequential: {sequential_time:.2f}s")
-    logging.info(f"Parallel:   {parallel_time:.2f}s") 
-    logging.info(f"Speedup:    {sequential_time/parallel_time:.2f}x")
\ No newline at end of file
+    with WorkerLogging() as worker_logging:
+        tasks = [50000000] * 4
+
+        # Sequential execution
+        start_time = time.time()
+        sequential_results = [cpu_task(n) for n in tasks]
+        sequential_time = time.time() - start_time
+
+        # Parallel execution (persistent pool, started before timing)
+        with ComputeEngine(processes=4, log_queue=worker_logging.queue, instrument=True) as engine:
+            engine.pool
+            start_time = time.time()
+            parallel_results = engine.map(cpu_task, tasks)
+            parallel_time = time.time() - start_time
+
+        logging.info(f"Sequential: {sequential_time:.2f}s")
+        logging.info(f"Parallel:   {parallel_time:.2f}s")
+        logging.info(f"Speedup:    {sequential_time/parallel_time:.2f}x")
+
+    print("\nPer-worker metrics:")
+    print_metrics_summary(engine.metrics)
+
+    # One big range split across the pool, per backend and core count
+    print()
+    scaling_report(tasks[0])
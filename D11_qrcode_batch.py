@@ -0,0 +1,291 @@
+'''
+Bulk QR code generation for D11_qrcode.
+
+Builds ticket and WiFi codes by the hundred thousand: payloads come from a
+CSV or JSONL file and are fanned out over a process pool. Each code's
+module matrix is turned into an image with NumPy, not drawn box by box;
+the result is pixel-identical to qrcode's plain PilImage. Styled
+(RoundedModuleDrawer) codes still go through StyledPilImage.
+
+Rendered files are kept in a content-addressed disk cache keyed by payload,
+version, error correction, mask, style and format, so re-issuing a code is
+a file copy. The least recently used entries are evicted as the cache
+grows, so it stays near max_bytes during a run, not only after it.
+
+format='matrix' skips images altogether and writes the module matrix as a
+.npy file: one bit per module, packed with np.packbits, or bool with
+packed=False.
+
+Usage:
+    python D11_qrcode_batch.py generate tickets.csv out/ --style rounded --workers 8
+    python D11_qrcode_batch.py bench --count 2000
+'''
+
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import argparse
+import contextlib
+import csv
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+import qrcode
+from qrcode.image.styledpil import StyledPilImage
+from qrcode.image.styles.moduledrawers import RoundedModuleDrawer
+
+ERROR_CORRECTION = {
+    'L': qrcode.constants.ERROR_CORRECT_L,
+    'M': qrcode.constants.ERROR_CORRECT_M,
+    'Q': qrcode.constants.ERROR_CORRECT_Q,
+    'H': qrcode.constants.ERROR_CORRECT_H,
+}
+STYLES = ('plain', 'rounded')
+FORMATS = {'png': '.png', 'matrix': '.npy'}
+
+def build_qr(payload, version=None, error_correction='M', border=4, box_size=10, mask_pattern=None):
+    """
+    A laid-out QRCode. mask_pattern=None lets qrcode try all 8 masks and keep
+    the best (the D11 behaviour); fixing one (0-7) still gives a valid code and
+    makes this step several times faster.
+    """
+    qr = qrcode.QRCode(version=version, error_correction=ERROR_CORRECTION[error_correction],
+                       box_size=box_size, border=border, mask_pattern=mask_pattern)
+    qr.add_data(payload)
+    qr.make(fit=version is None)
+    return qr
+
+def qr_matrix(qr):
+    """Module matrix, border included, as a bool array (True = dark)"""
+    return np.array(qr.get_matrix(), dtype=bool)
+
+def render_plain(matrix, box_size=10):
+    """Black-on-white mode '1' image, identical to qr.make_image() for the default colours"""
+    return Image.fromarray(~matrix.repeat(box_size, axis=0).repeat(box_size, axis=1))
+
+def render(qr, style='plain', box_size=10):
+    if style == 'plain':
+        return render_plain(qr_matrix(qr), box_size)
+    if style == 'rounded':
+        return qr.make_image(image_factory=StyledPilImage, module_drawer=RoundedModuleDrawer()).get_image()
+    raise ValueError(f"unknown style {style!r}; expected one of {STYLES}")
+
+def encode(payload, style='plain', fmt='png', version=None, error_correction='M',
+           border=4, box_size=10, mask_pattern=None, packed=True):
+    """One code as file bytes: PNG, or .npy of the (packed) module matrix"""
+    qr = build_qr(payload, version, error_correction, border, box_size, mask_pattern)
+    buf = io.BytesIO()
+    if fmt == 'matrix':
+        matrix = qr_matrix(qr)
+        np.save(buf, np.packbits(matrix, axis=1) if packed else matrix)
+    else:
+        render(qr, style, box_size).save(buf, format='PNG')
+    return buf.getvalue()
+
+class QRCache:
+    """
+    Content-addressed store: <root>/<2 hex>/<sha256><ext>. Hits refresh the
+    file's mtime, and evict() removes oldest-first until the total is under
+    max_bytes. Writes are atomic, so several worker processes can share one.
+    """
+    def __init__(self, root, max_bytes=512 << 20):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def key(**spec):
+        return hashlib.sha256(json.dumps(spec, sort_keys=True).encode()).hexdigest()
+
+    def path(self, key, ext):
+        return self.root / key[:2] / f"{key}{ext}"
+
+    def get(self, key, ext):
+        path = self.path(key, ext)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put(self, key, ext, data):
+        path = self.path(key, ext)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+        return path
+
+    def evict(self):
+        """Drop least recently used entries until the cache fits; returns how many were removed"""
+        entries = []
+        total = 0
+        for path in self.root.glob('*/*'):
+            if path.name.startswith('.'):
+                continue
+            st = path.stat()
+            entries.append((st.st_mtime, st.st_size, path))
+            total += st.st_size
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+            removed += 1
+        return removed
+
+def _output_name(record_id, ext):
+    """File name for a record id from user input; refuses anything that could leave out_dir"""
+    name = str(record_id)
+    if (not name or name in ('.', '..') or '/' in name or '\\' in name or '\0' in name
+            or (os.altsep and os.altsep in name)):
+        raise ValueError(f"record id {record_id!r} is not usable as a file name")
+    return f"{name}{ext}"
+
+def _make_one(task):
+    """
+    Worker: one record -> output file. Returns (cache hit, bytes added to
+    the cache, error); a bad record is reported in error, never raised, so it
+    can't abort the batch.
+    """
+    record, out_dir, options, cache_root = task
+    ext = FORMATS[options['fmt']]
+    try:
+        out = Path(out_dir) / _output_name(record['id'], ext)
+    except ValueError as e:
+        return False, 0, str(e)
+    if cache_root is None:
+        out.write_bytes(encode(record['payload'], **options))
+        return False, 0, None
+    cache = QRCache(cache_root)
+    key = QRCache.key(payload=record['payload'], **options)
+    cached = cache.get(key, ext)
+    if cached is not None:
+        # A copy, not a hard link: outputs must not share mtime, contents or disk space with the cache
+        try:
+            shutil.copyfile(cached, out)
+            return True, 0, None
+        except FileNotFoundError:
+            pass    # evicted between get() and the copy; regenerate it
+    data = encode(record['payload'], **options)
+    cache.put(key, ext, data)
+    # Written from memory: the entry may already be evicted again
+    out.write_bytes(data)
+    return False, len(data), None
+
+def read_payloads(path):
+    """
+    Records {'id', 'payload'} from a CSV with a header or a JSONL file. A
+    missing (or null) id falls back to the row number; 0 and "" are kept.
+    """
+    path = Path(path)
+    with open(path, newline='', encoding='utf-8') as f:
+        rows = (json.loads(line) for line in f if line.strip()) if path.suffix == '.jsonl' else csv.DictReader(f)
+        for i, row in enumerate(rows):
+            record_id = row.get('id')
+            yield {'id': f"{i:08d}" if record_id is None else record_id, 'payload': row['payload']}
+
+def generate_batch(records, out_dir, style='plain', fmt='png', workers=1, cache_dir=None,
+                   max_cache_bytes=512 << 20, chunksize=64, **qr_options):
+    """
+    Write one file per record into out_dir, over `workers` processes.
+    qr_options go to build_qr/encode (version, error_correction, border,
+    box_size, mask_pattern, packed). Returns counts, codes/sec and an
+    'errors' list of (id, message) for records that were skipped.
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    options = {'style': style, 'fmt': fmt, **qr_options}
+    tasks = ((record, str(out_dir), options, cache_dir) for record in records)
+    cache = QRCache(cache_dir, max_cache_bytes) if cache_dir else None
+    # Evict during the run whenever a tenth of the budget has been added, not just at the end
+    evict_step = max(1, max_cache_bytes // 10)
+    hits = codes = evicted = added = 0
+    errors = []
+    start = time.perf_counter()
+    with ProcessPoolExecutor(workers) if workers > 1 else contextlib.nullcontext() as pool:
+        results = pool.map(_make_one, tasks, chunksize=chunksize) if pool else map(_make_one, tasks)
+        for hit, size, error in results:
+            if error is not None:
+                errors.append(error)
+                continue
+            codes += 1
+            hits += hit
+            added += size
+            if cache is not None and added >= evict_step:
+                evicted += cache.evict()
+                added = 0
+    elapsed = time.perf_counter() - start
+    if cache is not None:
+        evicted += cache.evict()
+    return {'codes': codes, 'cache_hits': hits, 'evicted': evicted, 'errors': errors,
+            'seconds': elapsed, 'codes_per_s': codes / elapsed if elapsed else 0.0}
+
+def benchmark(count=2000, workers=(1, os.cpu_count())):
+    """codes/sec for plain and styled PNGs and raw matrices, at 1 and N workers, cold and warm cache"""
+    records = [{'id': f"t{i:06d}", 'payload': f"TICKET:EVENT42:SEAT{i}"} for i in range(count)]
+    configs = [
+        ('qrcode make_image', None),
+        ('plain', {'style': 'plain'}),
+        ('plain, mask 0', {'style': 'plain', 'mask_pattern': 0}),
+        ('rounded', {'style': 'rounded'}),
+        ('matrix (1-bit)', {'fmt': 'matrix'}),
+    ]
+    print(f"{count:,} codes")
+    print(f"{'config':<20} {'workers':>7} {'cold codes/s':>13} {'warm codes/s':>13}")
+    with tempfile.TemporaryDirectory() as tmp:
+        # The D11 way, one QRCode and make_image per code, as the baseline
+        subset = records[:min(count, 500)]
+        start = time.perf_counter()
+        for r in subset:
+            qr = qrcode.QRCode(box_size=10, border=4)
+            qr.add_data(r['payload'])
+            qr.make(fit=True)
+            qr.make_image(fill_color="black", back_color="white").save(Path(tmp) / f"{r['id']}.png")
+        print(f"{'qrcode make_image':<20} {1:>7} {len(subset) / (time.perf_counter() - start):>13,.0f} {'-':>13}")
+
+        for label, options in configs[1:]:
+            for w in sorted(set(workers)):
+                cache = Path(tmp) / f"cache-{label}-{w}"
+                out = Path(tmp) / f"out-{label}-{w}"
+                cold = generate_batch(records, out, workers=w, cache_dir=str(cache), **options)
+                warm = generate_batch(records, out, workers=w, cache_dir=str(cache), **options)
+                print(f"{label:<20} {w:>7} {cold['codes_per_s']:>13,.0f} {warm['codes_per_s']:>13,.0f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk QR code generation")
+    sub = parser.add_subparsers(dest='command', required=True)
+    gen = sub.add_parser('generate', help="one file per payload from a CSV/JSONL with a 'payload' column")
+    gen.add_argument('payloads')
+    gen.add_argument('out_dir')
+    gen.add_argument('--style', choices=STYLES, default='plain')
+    gen.add_argument('--format', choices=FORMATS, default='png', dest='fmt')
+    gen.add_argument('--error-correction', choices=ERROR_CORRECTION, default='M')
+    gen.add_argument('--version', type=int, help="fixed QR version (default: smallest that fits)")
+    gen.add_argument('--mask', type=int, choices=range(8), help="fixed mask pattern (faster)")
+    gen.add_argument('--box-size', type=int, default=10)
+    gen.add_argument('--border', type=int, default=4)
+    gen.add_argument('--workers', type=int, default=os.cpu_count())
+    gen.add_argument('--cache', help="cache directory")
+    gen.add_argument('--cache-mb', type=int, default=512)
+    bench = sub.add_parser('bench')
+    bench.add_argument('--count', type=int, default=2000)
+    args = parser.parse_args()
+
+    if args.command == 'generate':
+        stats = generate_batch(read_payloads(args.payloads), args.out_dir, args.style, args.fmt,
+                               args.workers, args.cache, args.cache_mb << 20,
+                               version=args.version, error_correction=args.error_correction,
+                               mask_pattern=args.mask, box_size=args.box_size, border=args.border)
+        print(f"{stats['codes']:,} codes in {stats['seconds']:.2f}s ({stats['codes_per_s']:,.0f}/s), "
+              f"{stats['cache_hits']:,} from cache, {stats['evicted']:,} evicted")
+        for error in stats['errors']:
+            print(f"skipped: {error}")
+    else:
+        benchmark(args.count)
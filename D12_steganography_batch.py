@@ -0,0 +1,232 @@
+'''
+Batch steganography over whole directories.
+
+Streams images through a bounded process pool so PIL decode and PNG
+encode run on every core, records per-file timings and failures
+without stopping the run, and skips files whose output is already
+up to date for the same input content and message.
+
+Usage:
+    python D12_steganography_batch.py hide photos/ stego/ --message "meet at noon"
+    python D12_steganography_batch.py extract stego/ revealed/
+    python D12_steganography_batch.py bench
+'''
+
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from pathlib import Path
+import argparse
+import csv
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+from D12_steganography import hide_message, extract_message
+
+IMAGE_SUFFIXES = {'.png', '.bmp', '.tif', '.tiff'}
+STATE_FILE = '.stego_state.json'
+REPORT_FILE = 'report.jsonl'
+
+def _file_digest(path, message, bits):
+    """Content hash of the input file plus everything that changes the output"""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    h.update(b'\0' + str(bits).encode() + b'\0' + (message or '').encode('utf-8'))
+    return h.hexdigest()
+
+def output_name(path, root):
+    """
+    Output file name for an input: its stem plus a short digest of its path
+    relative to the input root, so a/img.png, b/img.png and img.bmp never
+    share an output, and a moved input tree still resumes.
+    """
+    path = Path(path)
+    try:
+        key = path.relative_to(root).as_posix()
+    except ValueError:
+        key = str(path.resolve())
+    return f"{path.stem}-{hashlib.sha256(key.encode('utf-8')).hexdigest()[:12]}.png"
+
+def iter_tasks(source, message=None):
+    """
+    Yield (path, message, name) from a directory (every image in it, sorted)
+    or a CSV manifest with a `path` column and an optional `message` column;
+    name is the output_name() that results and resume state are keyed on.
+    Relative manifest paths are resolved against the manifest's folder. A
+    manifest row without a path yields path=None, which is reported as a
+    failure for that row only.
+    """
+    source = Path(source)
+    if source.is_dir():
+        for path in sorted(source.iterdir()):
+            if path.suffix.lower() in IMAGE_SUFFIXES:
+                yield path, message, output_name(path, source)
+        return
+    with open(source, newline='') as f:
+        for line, row in enumerate(csv.DictReader(f), start=2):
+            if not row.get('path'):
+                yield None, message, f"{source.name}:{line}"
+                continue
+            path = Path(row['path'])
+            if not path.is_absolute():
+                path = source.parent / path
+            yield path, row.get('message') or message, output_name(path, source.parent)
+
+def _process_one(mode, path, message, name, bits, out_dir, previous):
+    """Run one file; never raises, so a bad image can't take the batch down"""
+    start = time.perf_counter()
+    result = {'path': str(path if path is not None else name), 'name': name, 'status': 'ok',
+              'seconds': 0.0, 'error': None}
+    try:
+        if path is None:
+            raise ValueError("manifest row has no path")
+        if mode == 'hide' and message is None:
+            raise ValueError("no message: pass --message or add a message column")
+        digest = _file_digest(path, message if mode == 'hide' else None, bits)
+        result['digest'] = digest
+        out_path = Path(out_dir) / name
+        if previous and previous.get('digest') == digest and (mode == 'extract' or out_path.exists()):
+            result['status'] = 'skipped'
+            result.update({k: v for k, v in previous.items() if k in ('output', 'message')})
+        elif mode == 'hide':
+            hide_message(path, message, out_path, bits)
+            result['output'] = str(out_path)
+        else:
+            result['message'] = extract_message(path)
+    except Exception as e:
+        result['status'] = 'failed'
+        result['error'] = f"{type(e).__name__}: {e}"
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+def _process_chunk(mode, chunk, bits, out_dir):
+    return [_process_one(mode, path, message, name, bits, out_dir, previous)
+            for path, message, name, previous in chunk]
+
+def _chunks(tasks, size):
+    chunk = []
+    for task in tasks:
+        chunk.append(task)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def run_batch(mode, source, out_dir, message=None, bits=1, workers=None,
+              chunksize=8, max_pending=None, force=False, verbose=True):
+    """
+    Hide `message` in (mode='hide') or extract messages from (mode='extract')
+    every image in `source`, writing PNGs, a report.jsonl and the up-to-date
+    state into out_dir. Tasks are submitted `chunksize` files at a time with at
+    most `max_pending` chunks in flight (default 2 per worker), so huge
+    directories are streamed rather than queued up front.
+    Returns the list of per-file result dicts.
+    """
+    if mode not in ('hide', 'extract'):
+        raise ValueError(f"mode must be 'hide' or 'extract', got {mode!r}")
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    workers = workers or os.cpu_count()
+    max_pending = max_pending or 2 * workers
+
+    state_path = out_dir / STATE_FILE
+    state = {} if force or not state_path.exists() else json.loads(state_path.read_text())
+    tasks = ((path, msg, name, state.get(name)) for path, msg, name in iter_tasks(source, message))
+
+    results = []
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool, open(out_dir / REPORT_FILE, 'w') as report:
+        pending = set()
+        chunks = _chunks(tasks, chunksize)
+        while True:
+            # Top up to the in-flight limit, then wait for at least one chunk to finish
+            for chunk in chunks:
+                pending.add(pool.submit(_process_chunk, mode, chunk, bits, out_dir))
+                if len(pending) >= max_pending:
+                    break
+            if not pending:
+                break
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                for result in future.result():
+                    results.append(result)
+                    report.write(json.dumps(result) + '\n')
+                    if result['status'] != 'failed':
+                        state[result['name']] = {k: result[k] for k in ('digest', 'output', 'message')
+                                                 if k in result}
+                    if verbose:
+                        _print_result(result)
+    state_path.write_text(json.dumps(state))
+
+    if verbose:
+        elapsed = time.perf_counter() - start
+        counts = {s: sum(r['status'] == s for r in results) for s in ('ok', 'skipped', 'failed')}
+        print(f"\n📦 {len(results)} files in {elapsed:.2f}s with {workers} workers "
+              f"({counts['ok']} ok, {counts['skipped']} skipped, {counts['failed']} failed)")
+    return results
+
+def _print_result(result):
+    icon = {'ok': '✅', 'skipped': '⏭️ ', 'failed': '❌'}[result['status']]
+    detail = result['error'] or result.get('message') or result.get('output') or ''
+    print(f"{icon} {result['seconds']*1000:7.1f}ms  {Path(result['path']).name}  {detail}")
+
+def benchmark(n_images=64, size=(1920, 1080), worker_counts=None):
+    """Time hide + extract over a generated image set at 1, 2, 4 and N workers"""
+    worker_counts = worker_counts or sorted({1, 2, 4, os.cpu_count()})
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        src = Path(tmp) / 'src'
+        src.mkdir()
+        for i in range(n_images):
+            pixels = rng.integers(0, 256, (size[1], size[0], 3), dtype=np.uint8)
+            Image.fromarray(pixels).save(src / f"img_{i:04d}.png")
+
+        print(f"{n_images} images at {size[0]}x{size[1]}")
+        print(f"{'workers':>7} {'hide img/s':>11} {'extract img/s':>14} {'speedup':>8}")
+        baseline = None
+        for workers in worker_counts:
+            out = Path(tmp) / f"out_{workers}"
+            start = time.perf_counter()
+            run_batch('hide', src, out, message='benchmark payload', workers=workers, verbose=False)
+            hide_time = time.perf_counter() - start
+            start = time.perf_counter()
+            run_batch('extract', out, Path(tmp) / f"revealed_{workers}", workers=workers, verbose=False)
+            extract_time = time.perf_counter() - start
+            baseline = baseline or hide_time + extract_time
+            print(f"{workers:>7} {n_images/hide_time:>11.1f} {n_images/extract_time:>14.1f} "
+                  f"{baseline/(hide_time + extract_time):>7.2f}x")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batch hide/extract messages in images")
+    sub = parser.add_subparsers(dest='command', required=True)
+    for name in ('hide', 'extract'):
+        p = sub.add_parser(name)
+        p.add_argument('source', help="directory of images or CSV manifest (path[,message])")
+        p.add_argument('out_dir')
+        if name == 'hide':
+            p.add_argument('--message', help="message for rows without their own")
+            p.add_argument('--bits', type=int, default=1, choices=(1, 2, 4))
+        p.add_argument('--workers', type=int)
+        p.add_argument('--chunksize', type=int, default=8)
+        p.add_argument('--force', action='store_true', help="ignore up-to-date outputs")
+    bench = sub.add_parser('bench')
+    bench.add_argument('--images', type=int, default=64)
+    args = parser.parse_args(argv)
+
+    if args.command == 'bench':
+        benchmark(n_images=args.images)
+        return 0
+    results = run_batch(args.command, args.source, args.out_dir,
+                        message=getattr(args, 'message', None), bits=getattr(args, 'bits', 1),
+                        workers=args.workers, chunksize=args.chunksize, force=args.force)
+    return 1 if any(r['status'] == 'failed' for r in results) else 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
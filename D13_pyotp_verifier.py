@@ -0,0 +1,234 @@
+'''
+High-throughput TOTP verification extending D13_pyotp.
+
+totp.verify(code) base32-decodes the secret and computes a fresh HMAC for
+every time step in the window on every call. TOTPVerifier does that work
+once:
+
+- secrets are base32-decoded when a user is added, and only the raw key
+  bytes are kept;
+- the codes for steps t-window..t+window are computed the first time a
+  user verifies in a step and stored together in one small bytes object.
+  Later requests in the same step are a lookup, and when the step
+  advances only the one new code is computed;
+- accepted (user, step) pairs go into a replay table, so a code cannot be
+  used twice. Entries that can no longer match are evicted a couple at a
+  time by later requests, so no request pays for a sweep of every user at
+  a step boundary;
+- verify_many() reads the clock once for a whole batch.
+
+Codes are the same as pyotp.TOTP(secret).at(t) (SHA1, 6 digits, 30 s).
+'''
+
+from collections import deque
+import argparse
+import base64
+import hmac
+import os
+import time
+import tracemalloc
+
+import pyotp
+
+def decode_secret(secret):
+    """base32 secret -> key bytes, tolerating missing padding and lowercase, like pyotp"""
+    secret = secret.replace(' ', '')
+    return base64.b32decode(secret + '=' * (-len(secret) % 8), casefold=True)
+
+def hotp(key, counter, digits=6, digest='sha1'):
+    """RFC 4226 code for one counter as a zero-padded string"""
+    mac = hmac.digest(key, counter.to_bytes(8, 'big'), digest)
+    offset = mac[-1] & 0x0F
+    code = int.from_bytes(mac[offset:offset + 4], 'big') & 0x7FFFFFFF
+    return str(code % 10 ** digits).zfill(digits)
+
+class TOTPVerifier:
+    """
+    Verifies TOTP codes for many users. window is the number of steps
+    accepted on either side of the current one, like valid_window in
+    pyotp's verify().
+    """
+    def __init__(self, digits=6, interval=30, window=1, digest='sha1', clock=time.time):
+        self.digits = digits
+        self.interval = interval
+        self.window = window
+        self.digest = digest
+        self.clock = clock
+        self._keys = {}       # user_id -> key bytes
+        self._codes = {}      # user_id -> (step, codes for step-window..step+window as one ASCII bytes)
+        self._used = {}       # user_id -> last accepted step (replay protection)
+        self._codes_expiry = deque()  # (step the entry stops being needed, user_id), oldest first
+        self._used_expiry = deque()
+        self.stats = {'verified': 0, 'accepted': 0, 'replays': 0, 'hmacs': 0}
+
+    def __len__(self):
+        return len(self._keys)
+
+    def add_user(self, user_id, secret):
+        self._keys[user_id] = decode_secret(secret)
+        self._codes.pop(user_id, None)
+
+    def remove_user(self, user_id):
+        self._keys.pop(user_id, None)
+        self._codes.pop(user_id, None)
+        self._used.pop(user_id, None)
+
+    def _current_step(self, at=None):
+        return int((self.clock() if at is None else at) // self.interval)
+
+    @staticmethod
+    def _expire(queue, table, expires_at, step):
+        """Pop up to two aged-out entries; skip ones overwritten since they were queued"""
+        for _ in range(2):
+            if not queue or queue[0][0] > step:
+                return
+            expires, user_id = queue.popleft()
+            entry = table.get(user_id)
+            if entry is not None and expires_at(entry) == expires:
+                del table[user_id]
+
+    def _evict(self, step):
+        """
+        Called once per request: each request adds at most one entry to each
+        table and removes up to two, so eviction keeps pace at O(1) per request
+        instead of a sweep over every user when the step changes.
+        """
+        self._expire(self._codes_expiry, self._codes, lambda entry: entry[0] + 2, step)
+        window = self.window
+        self._expire(self._used_expiry, self._used, lambda used: used + window + 1, step)
+
+    def _window_codes(self, user_id, step):
+        entry = self._codes.get(user_id)
+        if entry is not None and entry[0] == step:
+            return entry[1]
+        key = self._keys[user_id]
+        w, d = self.window, self.digits
+        if entry is not None and 0 < step - entry[0] <= 2 * w:
+            # Slide the window: keep the overlap, compute only the new steps
+            shift = step - entry[0]
+            fresh = ''.join(hotp(key, s, d, self.digest) for s in range(step + w - shift + 1, step + w + 1))
+            codes = entry[1][shift * d:] + fresh.encode()
+            self.stats['hmacs'] += shift
+        else:
+            codes = ''.join(hotp(key, s, d, self.digest) for s in range(step - w, step + w + 1)).encode()
+            self.stats['hmacs'] += 2 * w + 1
+        self._codes[user_id] = (step, codes)
+        # Dropped once the user has been idle for a whole step
+        self._codes_expiry.append((step + 2, user_id))
+        return codes
+
+    def refresh(self, user_ids, at=None):
+        """Precompute this step's codes for a set of active users, e.g. right after a step boundary"""
+        step = self._current_step(at)
+        for user_id in user_ids:
+            self._evict(step)
+            self._window_codes(user_id, step)
+
+    def _verify(self, user_id, code, step):
+        self.stats['verified'] += 1
+        self._evict(step)
+        if user_id not in self._keys:
+            return False
+        code = str(code).encode()
+        codes = self._window_codes(user_id, step)
+        d = self.digits
+        matched = None
+        for i in range(2 * self.window + 1):
+            # compare every candidate so timing does not reveal which step matched
+            if hmac.compare_digest(code, codes[i * d:(i + 1) * d]) and matched is None:
+                matched = step - self.window + i
+        if matched is None:
+            return False
+        if self._used.get(user_id, -1) >= matched:
+            self.stats['replays'] += 1
+            return False
+        self._used[user_id] = matched
+        # Once matched falls out of the window no code can collide with it
+        self._used_expiry.append((matched + self.window + 1, user_id))
+        self.stats['accepted'] += 1
+        return True
+
+    def verify(self, user_id, code, at=None):
+        """True if code is valid for user_id now (or at unix time `at`) and has not been used"""
+        return self._verify(user_id, code, self._current_step(at))
+
+    def verify_many(self, requests, at=None):
+        """[(user_id, code), ...] -> [bool, ...], all checked against the same time step"""
+        step = self._current_step(at)
+        verify = self._verify
+        return [verify(user_id, code, step) for user_id, code in requests]
+
+    def memory(self):
+        """Entries in each table, for sizing"""
+        return {'users': len(self._keys), 'active': len(self._codes), 'replay': len(self._used)}
+
+def _allocated(build):
+    """Bytes still allocated by whatever build() returns"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = build()
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del kept
+    return size
+
+def benchmark(users=1_000_000, requests=200_000):
+    """
+    verifications/sec against plain pyotp, and memory per user for the
+    decoded-key cache and the per-step code cache
+    """
+    secrets = [base64.b32encode(os.urandom(20)).decode() for _ in range(users)]
+    now = time.time()
+    sample = range(0, users, max(1, users // requests))
+    batch = [(i, pyotp.TOTP(secrets[i]).at(now)) for i in sample]
+
+    # Plain pyotp, as in D13: base32 secrets at rest, a TOTP per request
+    start = time.perf_counter()
+    for i, code in batch:
+        assert pyotp.TOTP(secrets[i]).verify(code, valid_window=1)
+    plain = time.perf_counter() - start
+
+    verifier = TOTPVerifier(clock=lambda: now)
+    for i, secret in enumerate(secrets):
+        verifier.add_user(i, secret)
+    start = time.perf_counter()
+    assert all(verifier.verify_many(batch))
+    cold = time.perf_counter() - start
+
+    # Same users again in the same step: codes are cached, the replay table rejects them
+    start = time.perf_counter()
+    assert not any(verifier.verify_many(batch))
+    warm = time.perf_counter() - start
+
+    # Memory, measured separately because tracemalloc slows everything down
+    strings_bytes = _allocated(lambda: {i: s.encode().decode() for i, s in enumerate(secrets)})
+    keys_bytes = _allocated(lambda: {i: decode_secret(s) for i, s in enumerate(secrets)})
+    probe = TOTPVerifier(clock=lambda: now)
+    for i, secret in enumerate(secrets):
+        probe.add_user(i, secret)
+    codes_bytes = _allocated(lambda: probe.verify_many(batch))
+
+    n = len(batch)
+    print(f"{users:,} users, {n:,} verifications")
+    print(f"{'method':<34} {'verifications/s':>16}")
+    print(f"{'pyotp TOTP(secret).verify':<34} {n / plain:>16,.0f}")
+    print(f"{'TOTPVerifier, first in step':<34} {n / cold:>16,.0f}")
+    print(f"{'TOTPVerifier, codes cached':<34} {n / warm:>16,.0f}")
+    print(f"Memory: base32 secrets {strings_bytes / users:.0f} B/user, decoded keys "
+          f"{keys_bytes / users:.0f} B/user, window codes + replay entry {codes_bytes / n:.0f} B/active user")
+    print(f"Stats: {verifier.stats}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Batch TOTP verification benchmark")
+    parser.add_argument('--users', type=int, default=1_000_000)
+    parser.add_argument('--requests', type=int, default=200_000)
+    args = parser.parse_args()
+
+    secret = pyotp.random_base32()
+    verifier = TOTPVerifier()
+    verifier.add_user('user@example.com', secret)
+    code = pyotp.TOTP(secret).now()
+    print(f"✅ First use: {verifier.verify('user@example.com', code)}")
+    print(f"🔁 Replayed:  {verifier.verify('user@example.com', code)}")
+    print()
+    benchmark(args.users, args.requests)
@@ -0,0 +1,194 @@
+'''
+Incrementally maintained sales aggregates for the D14_polars queries.
+
+Instead of rerunning group_by('product').agg(mean, count) over the whole
+history whenever rows arrive, IncrementalAggregates keeps the partial state
+(sum and count per product and per region) in small Parquet files. An
+appended micro-batch is aggregated on its own and merged into that state,
+so an append costs O(batch + groups) no matter how long the history is.
+avg_sales() answers from the state alone, and check() compares it with a
+full recompute.
+'''
+
+from pathlib import Path
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import polars as pl
+
+from D14_polars_streaming import PRODUCTS, REGIONS, product_summary
+
+class IncrementalAggregates:
+    """
+    Running sum/count of sales per key column, persisted under `path`.
+    Each save writes a new directory v<N>/ (one <key>.parquet per key plus
+    state.json) and then atomically points CURRENT at it, so a crash
+    mid-save leaves the previous version intact. Rows with sales <=
+    min_sales are skipped, matching the D14 filter.
+    """
+    def __init__(self, path, keys=('product', 'region'), min_sales=100):
+        self.path = Path(path)
+        self.keys = tuple(keys)
+        self.min_sales = min_sales
+        self.rows = 0
+        self.batches = 0
+        self.version = 0
+        self.applied = {}       # source -> highest batch id folded in, so a retried batch is not counted twice
+        self.state = {key: self._empty(key) for key in self.keys}
+        if (self.path / 'CURRENT').exists():
+            self._load()
+
+    def _empty(self, key):
+        return pl.DataFrame(schema={key: pl.String, 'sum': pl.Int64, 'count': pl.Int64})
+
+    def _load(self):
+        version_dir = self.path / (self.path / 'CURRENT').read_text().strip()
+        meta = json.loads((version_dir / 'state.json').read_text())
+        if tuple(meta['keys']) != self.keys or meta['min_sales'] != self.min_sales:
+            raise ValueError(f"state in {self.path} was built with keys={meta['keys']}, "
+                             f"min_sales={meta['min_sales']}")
+        self.rows, self.batches, self.version = meta['rows'], meta['batches'], meta['version']
+        self.applied = dict(meta['applied'])
+        for key in self.keys:
+            self.state[key] = pl.read_parquet(version_dir / f"{key}.parquet")
+
+    def _save(self):
+        # Build the whole new version first; swapping the CURRENT pointer is the commit
+        version = self.version + 1
+        name = f"v{version:08d}"
+        version_dir = self.path / name
+        if version_dir.exists():
+            shutil.rmtree(version_dir)     # left over from a crashed save
+        version_dir.mkdir(parents=True)
+        for key, frame in self.state.items():
+            frame.write_parquet(version_dir / f"{key}.parquet")
+        (version_dir / 'state.json').write_text(json.dumps({
+            'keys': self.keys, 'min_sales': self.min_sales, 'rows': self.rows,
+            'batches': self.batches, 'version': version, 'applied': self.applied,
+        }))
+        pointer = self.path / '.CURRENT.tmp'
+        pointer.write_text(name)
+        os.replace(pointer, self.path / 'CURRENT')
+        self.version = version
+        for old in self.path.glob('v*'):
+            if old.name != name:
+                shutil.rmtree(old, ignore_errors=True)
+
+    def append(self, batch, batch_id=None, source='default', save=True):
+        """
+        Fold a DataFrame of new rows (product, sales, region) into the state.
+        batch_id is an int that increases with every batch from `source`;
+        only the highest id per source is kept, so a retried or replayed
+        batch (id <= that mark) is skipped and False returned. True otherwise.
+        """
+        if batch_id is not None:
+            if type(batch_id) is not int or not isinstance(source, str):
+                raise TypeError(f"batch_id must be an int and source a str, got {batch_id!r}, {source!r}")
+            if batch_id <= self.applied.get(source, -1):
+                return False
+        filtered = batch.filter(pl.col('sales') > self.min_sales)
+        for key in self.keys:
+            partial = filtered.group_by(key).agg(
+                pl.col('sales').sum().alias('sum'),
+                pl.len().cast(pl.Int64).alias('count'),
+            )
+            # vertical_relaxed: float sales turn the (initially Int64) sums into floats
+            self.state[key] = (
+                pl.concat([self.state[key], partial], how='vertical_relaxed')
+                .group_by(key)
+                .agg(pl.col('sum').sum(), pl.col('count').sum())
+            )
+        self.rows += batch.height
+        self.batches += 1
+        if batch_id is not None:
+            self.applied[source] = batch_id
+        if save:
+            self._save()
+        return True
+
+    def avg_sales(self, key='product'):
+        """Same columns and order as product_summary() when key='product'"""
+        return (
+            self.state[key]
+            .select(key,
+                    (pl.col('sum') / pl.col('count')).alias('avg_sales'),
+                    pl.col('count'))
+            .sort('avg_sales', descending=True)
+        )
+
+    def check(self, history, rel_tol=1e-9):
+        """
+        Recompute every key from the full history (a DataFrame or LazyFrame)
+        and compare with the maintained state; raises AssertionError on a mismatch.
+        """
+        history = history.lazy()
+        for key in self.keys:
+            if key == 'product':
+                expected = product_summary(history, self.min_sales).collect()
+            else:
+                expected = (
+                    history
+                    .filter(pl.col('sales') > self.min_sales)
+                    .group_by(key)
+                    .agg(pl.col('sales').mean().alias('avg_sales'),
+                         pl.col('sales').count().alias('count'))
+                    .collect()
+                )
+            got = self.avg_sales(key)
+            joined = expected.join(got, on=key, how='full', coalesce=True, suffix='_incr')
+            bad = joined.filter(
+                (pl.col('count') != pl.col('count_incr'))
+                | pl.col('count').is_null() | pl.col('count_incr').is_null()
+                | ((pl.col('avg_sales') - pl.col('avg_sales_incr')).abs()
+                   > rel_tol * pl.col('avg_sales').abs())
+            )
+            if bad.height:
+                raise AssertionError(f"incremental '{key}' aggregates differ from a full recompute:\n{bad}")
+        return True
+
+def random_batch(rng, n):
+    return pl.DataFrame({
+        'product': np.array(PRODUCTS)[rng.integers(0, len(PRODUCTS), n)],
+        'sales': rng.integers(0, 1000, n),
+        'region': np.array(REGIONS)[rng.integers(0, len(REGIONS), n)],
+    })
+
+def benchmark(batches=1000, batch_rows=10_000, report_every=100, seed=0):
+    """
+    Append latency (incl. saving state) as history grows, next to the cost
+    of the full recompute it replaces; finishes with a check() against it.
+    """
+    rng = np.random.default_rng(seed)
+    history = []
+    with tempfile.TemporaryDirectory() as tmp:
+        agg = IncrementalAggregates(tmp)
+        print(f"{'history rows':>13} {'append ms':>10} {'recompute ms':>13}")
+        window = []
+        for i in range(1, batches + 1):
+            batch = random_batch(rng, batch_rows)
+            history.append(batch)
+            start = time.perf_counter()
+            agg.append(batch, batch_id=i)
+            window.append(time.perf_counter() - start)
+            if i % report_every == 0:
+                full = pl.concat(history, rechunk=False)
+                start = time.perf_counter()
+                product_summary(full.lazy()).collect()
+                recompute = time.perf_counter() - start
+                print(f"{full.height:>13,} {1000 * sum(window) / len(window):>10.2f} {1000 * recompute:>13.2f}")
+                window = []
+        agg.check(pl.concat(history))
+        print("Incremental state matches a full recompute")
+        print(agg.avg_sales())
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Incremental D14 sales aggregates")
+    parser.add_argument('--batches', type=int, default=1000)
+    parser.add_argument('--batch-rows', type=int, default=10_000)
+    args = parser.parse_args()
+    benchmark(args.batches, args.batch_rows, report_every=max(1, args.batches // 10))
@@ -0,0 +1,199 @@
+'''
+Out-of-core versions of the D14_polars sales queries.
+
+The filter -> group_by('product') -> agg and the rank().over('region')
+queries are built as LazyFrames over scan_parquet / scan_csv sources, run
+on Polars' streaming engine and written with sink_parquet, so data larger
+than RAM never has to be materialized. The window query has a
+streaming-friendly rewrite (top_per_region_streaming) because a window over
+the full column forces it into memory. Also includes a chunked data
+generator and an eager vs lazy vs streaming benchmark (wall time and peak
+RSS, each run in a fresh process).
+
+Usage:
+    python D14_polars_streaming.py generate sales/ --rows 10000000
+    python D14_polars_streaming.py bench --rows 1000000 10000000 100000000
+'''
+
+from pathlib import Path
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import polars as pl
+
+PRODUCTS = ['A', 'B', 'C']
+REGIONS = ['North', 'South']
+
+def scan(source):
+    """LazyFrame over a Parquet/CSV file, a glob, or a directory of Parquet parts"""
+    source = Path(source)
+    if source.is_dir():
+        return pl.scan_parquet(source / '*.parquet')
+    if source.suffix == '.csv':
+        return pl.scan_csv(source)
+    return pl.scan_parquet(source)
+
+def product_summary(lf, min_sales=100):
+    """The D14 group_by query: average and count of sales above min_sales per product"""
+    return (
+        lf
+        .filter(pl.col('sales') > min_sales)
+        .group_by('product')
+        .agg([
+            pl.col('sales').mean().alias('avg_sales'),
+            pl.col('sales').count().alias('count')
+        ])
+        .sort('avg_sales', descending=True)
+    )
+
+def top_per_region(lf, k=10):
+    """The D14 window query: commission plus the k lowest-ranked sales in each region"""
+    return (
+        lf
+        .with_columns([
+            (pl.col('sales') * 0.1).alias('commission'),
+            pl.col('sales').rank().over('region').alias('rank')
+        ])
+        .filter(pl.col('rank') <= k)
+    )
+
+def top_per_region_streaming(lf, k=10):
+    """
+    Same rows and ranks as top_per_region without a window over the whole
+    column. Only values up to the k-th smallest in a region can have rank
+    <= k, so that cutoff is found first (a streamable bottom_k aggregation).
+    The average rank of a value is (rows below it) + (ties + 1) / 2, so it
+    comes from a small (region, sales) -> count table over the rows under
+    the cutoff, which is then joined back.
+    """
+    cutoff = lf.group_by('region').agg(pl.col('sales').bottom_k(k).max().alias('cutoff'))
+    candidates = (
+        lf
+        .join(cutoff, on='region', how='inner')
+        .filter(pl.col('sales') <= pl.col('cutoff'))
+        .drop('cutoff')
+    )
+    ranks = (
+        candidates
+        .group_by('region', 'sales')
+        .agg(pl.len().alias('ties'))
+        .sort('region', 'sales')
+        .with_columns(
+            ((pl.col('ties').cum_sum().over('region') - pl.col('ties'))
+             + (pl.col('ties') + 1) / 2).alias('rank')
+        )
+        .filter(pl.col('rank') <= k)
+        .select('region', 'sales', 'rank')
+    )
+    return (
+        candidates
+        .join(ranks, on=['region', 'sales'], how='inner')
+        .with_columns((pl.col('sales') * 0.1).alias('commission'))
+        .select(*lf.collect_schema().names(), 'commission', 'rank')
+    )
+
+def run(query, out_path=None):
+    """
+    Execute a LazyFrame on the streaming engine. With out_path the result is
+    streamed straight into a Parquet file; otherwise it is collected.
+    """
+    if out_path:
+        query.sink_parquet(out_path)
+        return out_path
+    return query.collect(engine='streaming')
+
+def generate_sales(out_dir, n_rows, chunk_rows=5_000_000, seed=0):
+    """
+    Write n_rows of synthetic sales as Parquet parts of chunk_rows each, so
+    generating 100M rows never needs more than one chunk in memory. Sales
+    are floats: with a small integer range every value ties with thousands
+    of rows, no rank is <= 10, and top_per_region comes back empty.
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    for part, start in enumerate(range(0, n_rows, chunk_rows)):
+        n = min(chunk_rows, n_rows - start)
+        pl.DataFrame({
+            'product': pl.Series(rng.integers(0, len(PRODUCTS), n)).replace_strict(
+                dict(enumerate(PRODUCTS)), return_dtype=pl.String),
+            'sales': rng.uniform(0, 1000, n),
+            'region': pl.Series(rng.integers(0, len(REGIONS), n)).replace_strict(
+                dict(enumerate(REGIONS)), return_dtype=pl.String),
+        }).write_parquet(out_dir / f"part-{part:05d}.parquet")
+    return out_dir
+
+MODES = ('eager', 'lazy', 'streaming')
+
+def _run_mode(mode, source, out_dir):
+    """Run both queries one way; called in a fresh interpreter by benchmark()"""
+    start = time.perf_counter()
+    if mode == 'eager':
+        df = pl.read_parquet(Path(source) / '*.parquet')
+        summary = product_summary(df.lazy()).collect()
+        top = top_per_region(df.lazy()).collect()
+    elif mode == 'lazy':
+        summary = product_summary(scan(source)).collect()
+        top = top_per_region(scan(source)).collect()
+    else:
+        summary = pl.read_parquet(run(product_summary(scan(source)), Path(out_dir) / 'product_summary.parquet'))
+        top = pl.read_parquet(run(top_per_region_streaming(scan(source)), Path(out_dir) / 'top_per_region.parquet'))
+    elapsed = time.perf_counter() - start
+    # An empty result would mean timing nothing
+    assert summary.height and top.height, f"{mode}: empty result"
+    # ru_maxrss is KiB on Linux
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    print(json.dumps({'seconds': elapsed, 'peak_rss': peak}))
+
+def benchmark(row_counts=(1_000_000, 10_000_000, 100_000_000), modes=MODES, workdir=None):
+    """Wall time and peak RSS of each mode at each size, every run in its own process"""
+    with tempfile.TemporaryDirectory(dir=workdir) as tmp:
+        print(f"{'rows':>12} {'mode':<10} {'seconds':>8} {'peak RSS MB':>12}")
+        for n in row_counts:
+            data = generate_sales(Path(tmp) / f"sales_{n}", n)
+            for mode in modes:
+                out = Path(tmp) / f"out_{n}_{mode}"
+                out.mkdir()
+                proc = subprocess.run([sys.executable, __file__, '_run', mode, str(data), str(out)],
+                                      capture_output=True, text=True)
+                if proc.returncode:
+                    print(f"{n:>12,} {mode:<10} failed: {proc.stderr.strip().splitlines()[-1]}")
+                    continue
+                result = json.loads(proc.stdout.strip().splitlines()[-1])
+                print(f"{n:>12,} {mode:<10} {result['seconds']:>8.2f} {result['peak_rss']/1e6:>12.0f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Streaming D14 sales queries")
+    sub = parser.add_subparsers(dest='command', required=True)
+    gen = sub.add_parser('generate')
+    gen.add_argument('out_dir')
+    gen.add_argument('--rows', type=int, default=10_000_000)
+    query = sub.add_parser('query', help="run both queries on a source and sink them to Parquet")
+    query.add_argument('source', help="Parquet/CSV file or directory of Parquet parts")
+    query.add_argument('out_dir')
+    bench = sub.add_parser('bench')
+    bench.add_argument('--rows', type=int, nargs='+', default=[1_000_000, 10_000_000, 100_000_000])
+    bench.add_argument('--workdir', help="where to put generated data (needs a few GB at 100M rows)")
+    worker = sub.add_parser('_run')
+    worker.add_argument('mode', choices=MODES)
+    worker.add_argument('source')
+    worker.add_argument('out_dir')
+    args = parser.parse_args()
+
+    if args.command == 'generate':
+        generate_sales(args.out_dir, args.rows)
+    elif args.command == 'query':
+        Path(args.out_dir).mkdir(parents=True, exist_ok=True)
+        run(product_summary(scan(args.source)), Path(args.out_dir) / 'product_summary.parquet')
+        run(top_per_region_streaming(scan(args.source)), Path(args.out_dir) / 'top_per_region.parquet')
+        print(pl.read_parquet(Path(args.out_dir) / 'product_summary.parquet'))
+    elif args.command == 'bench':
+        benchmark(args.rows, workdir=args.workdir)
+    else:
+        _run_mode(args.mode, args.source, args.out_dir)
@@ -10,22 +10,49 @@ with incredible speed and accuracy. From autonomous vehicles to
 security systems, YOLO powers the eyes of AI.
 '''
 
-from ultralytics import YOLO
 import cv2
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+import copy
+import threading
 import time
 
+from D16_ultralytics_pipeline import FramePipeline, FrameScheduler, batched
+from D16_ultralytics_bench import bench_config
+from D16_ultralytics_results import Detections, batched_nms
+
+def read_frames(cap):
+    """Yield frames from an open cv2.VideoCapture until it runs dry"""
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        yield frame
+
 class YOLODetector:
-    def __init__(self, model_size='n'):
+    def __init__(self, model_size='n', backend='torch', onnx_path=None, int8=False):
         """
         Initialize YOLO detector
         model_size: 'n' (nano), 's' (small), 'm' (medium), 'l' (large), 'x' (extra large)
+        backend: 'torch' runs the .pt weights through ultralytics,
+                 'onnx' runs the export_model('onnx') file with onnxruntime (no torch import)
+        onnx_path: ONNX file for the onnx backend (default: yolo11{model_size}.onnx)
+        int8: onnx backend only, use a dynamically quantized INT8 copy of the model
         """
-        self.model = YOLO(f'yolo11{model_size}.pt')  # Auto-downloads on first use
+        if backend == 'torch':
+            from ultralytics import YOLO
+            self.model = YOLO(f'yolo11{model_size}.pt')  # Auto-downloads on first use
+        elif backend == 'onnx':
+            from D16_ultralytics_onnx import OnnxYOLO, quantize_int8
+            onnx_path = onnx_path or f'yolo11{model_size}.onnx'
+            self.model = OnnxYOLO(quantize_int8(onnx_path) if int8 else onnx_path)
+        else:
+            raise ValueError(f"backend must be 'torch' or 'onnx', got {backend!r}")
+        self.backend = backend
         self.class_names = self.model.names
         
-    def detect_image(self, image_path, conf_threshold=0.5, save_result=True):
+    def detect_image(self, image_path, conf_threshold=0.5, save_result=True, print_detections=True):
         """Detect objects in a single image"""
         results = self.model(image_path, conf=conf_threshold)
         
@@ -37,96 +64,238 @@ class YOLODetector:
             print(f"Annotated image saved as: {output_path}")
         
         # Print detection results
-        for r in results:
-            boxes = r.boxes
-            if boxes is not None:
-                for box in boxes:
-                    cls_id = int(box.cls[0])
-                    conf = float(box.conf[0])
-                    coords = box.xyxy[0].tolist()
-                    
-                    print(f"Detected: {self.class_names[cls_id]} "
-                          f"(confidence: {conf:.2f}) "
-                          f"at [{coords[0]:.0f}, {coords[1]:.0f}, "
-                          f"{coords[2]:.0f}, {coords[3]:.0f}]")
+        if print_detections:
+            Detections.from_results(results).print(self.class_names)
         
         return results
     
-    def detect_video(self, video_path, conf_threshold=0.5, save_output=True):
-        """Detect objects in video"""
+    def detect_batch(self, sources, batch_size=8, conf_threshold=0.5, max_latency=None):
+        """
+        Detect objects in many images, batch_size at a time
+        sources: list or iterator of image paths and/or ndarrays (BGR)
+        max_latency: for live iterators, flush a partial batch after this many seconds
+        Yields one Results object per input, in input order.
+        """
+        for batch in batched(sources, batch_size, max_latency):
+            yield from self.model(batch, conf=conf_threshold, verbose=False)
+    
+    def collect_detections(self, sources, batch_size=8, conf_threshold=0.5, parquet_path=None):
+        """
+        Run detect_batch over sources and return every box as one columnar
+        Detections (frame_index = position in sources). Optionally writes Parquet.
+        """
+        parts = []
+        index = 0
+        for batch in batched(self.detect_batch(sources, batch_size, conf_threshold), batch_size):
+            parts.append(Detections.from_results(batch, index))
+            index += len(batch)
+        detections = Detections.concat(parts)
+        if parquet_path:
+            detections.to_parquet(parquet_path, self.class_names)
+            print(f"{len(detections)} detections from {index} images saved to {parquet_path}")
+        return detections
+    
+    def detect_tiled(self, image, tile_size=640, overlap=0.2, conf_threshold=0.5, iou_threshold=0.5,
+                     batch_size=16, workers=1, full_frame=True):
+        """
+        Detect small objects in a high-resolution image by running the model on
+        overlapping tile_size x tile_size crops at native resolution
+        image: path or ndarray (BGR)
+        overlap: fraction of each tile shared with its neighbour
+        workers: >1 runs tile batches on a thread pool (one model copy per thread)
+        full_frame: also run the whole image once so large objects aren't cut up
+        Returns Detections in full-image pixel coordinates, merged with
+        class-aware NMS across tiles.
+        """
+        if isinstance(image, (str, Path)):
+            image = cv2.imread(str(image))
+        height, width = image.shape[:2]
+        origins = [(x, y) for y in tile_starts(height, tile_size, overlap)
+                   for x in tile_starts(width, tile_size, overlap)]
+        tiles = [image[y:y + tile_size, x:x + tile_size] for x, y in origins]
+        chunks = [tiles[i:i + batch_size] for i in range(0, len(tiles), batch_size)]
+        
+        if workers > 1:
+            local = threading.local()
+            def run(chunk):
+                # ultralytics predictors keep per-call state, so each thread gets its own copy
+                if not hasattr(local, 'model'):
+                    local.model = copy.deepcopy(self.model) if self.backend == 'torch' else self.model
+                return local.model(chunk, conf=conf_threshold, verbose=False)
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                results = [r for rs in pool.map(run, chunks) for r in rs]
+        else:
+            results = [r for chunk in chunks for r in self.model(chunk, conf=conf_threshold, verbose=False)]
+        
+        detections = Detections.from_results(results)
+        # Tile i's boxes are relative to its origin; shift them into image coordinates
+        shift = np.array(origins, dtype=np.float32)[detections.frame_index]
+        detections.xyxy += np.tile(shift, 2)
+        detections.frame_index[:] = 0
+        if full_frame and len(origins) > 1:
+            detections = Detections.concat(
+                [detections, Detections.from_results(self.model(image, conf=conf_threshold, verbose=False))])
+        
+        keep = batched_nms(detections.xyxy, detections.confidences, detections.class_ids,
+                           iou_threshold, max_det=len(detections))
+        return detections.select(keep)
+    
+    def detect_video(self, video_path, conf_threshold=0.5, save_output=True,
+                     pipelined=True, queue_size=8, batch_size=1,
+                     target_fps=None, motion_threshold=None, detections_path=None):
+        """
+        Detect objects in video
+        pipelined: run decode, inference and annotate/encode on separate threads
+                   joined by bounded queues of queue_size items
+        batch_size: frames per model call
+        target_fps / motion_threshold: enable the FrameScheduler, which skips
+                   static frames and thins out inference to target_fps; skipped
+                   frames are annotated with the last detections
+        detections_path: write every inferred frame's boxes to this Parquet file
+        Returns the per-stage latency / FPS report, with the columnar
+        Detections of all inferred frames under 'detections'.
+        """
         cap = cv2.VideoCapture(video_path)
+        out = None
+        source_fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+        scheduler = None
+        if target_fps is not None or motion_threshold is not None:
+            scheduler = FrameScheduler(target_fps, source_fps, motion_threshold or 0.0)
         
         if save_output:
             # Setup video writer
             fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-            fps = int(cap.get(cv2.CAP_PROP_FPS))
+            fps = int(source_fps)
             width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
             height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
             
             output_path = f"detected_{Path(video_path).stem}.mp4"
             out = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
         
-        frame_count = 0
-        total_time = 0
+        frames = read_frames(cap)
+        if scheduler:
+            frames = ((frame, scheduler.should_infer(frame)) for frame in frames)
+        else:
+            frames = ((frame, True) for frame in frames)
         
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
+        last = {'results': None, 'inference_time': None}
+        collected = []
+        frame_index = 0
+        shown_fps = None
+        last_time = time.perf_counter()
+        
+        def infer(batch):
+            todo = [frame for frame, run in batch if run]
+            if todo:
+                start_time = time.perf_counter()
+                results = iter(self.model(todo, conf=conf_threshold, verbose=batch_size == 1))
+                # Per-frame share of the model call
+                last['inference_time'] = (time.perf_counter() - start_time) / len(todo)
+                if scheduler:
+                    scheduler.record_inference(last['inference_time'])
+            items = []
+            for frame, run in batch:
+                if run:
+                    last['results'] = next(results)
+                items.append((frame, last['results'], run))
+            return items, last['inference_time']
+        
+        def annotate(item):
+            nonlocal frame_index, shown_fps, last_time
+            items, _ = item
+            # End-to-end frames per second, as in detect_webcam: wall time per
+            # frame reaching this stage, so skipped frames don't inflate it
+            now = time.perf_counter()
+            loop_fps = len(items) / max(now - last_time, 1e-6)
+            shown_fps = loop_fps if shown_fps is None else 0.9 * shown_fps + 0.1 * loop_fps
+            last_time = now
+            for frame, r, fresh in items:
+                if fresh:
+                    collected.append(Detections.from_results([r], frame_index))
+                frame_index += 1
+                if out is None:
+                    continue
+                
+                # Skipped frames get the previous detections drawn on them
+                annotated_frame = r.plot() if fresh else r.plot(img=frame)
+                
+                # Add FPS info
+                fps_text = f"FPS: {shown_fps:.1f}"
+                cv2.putText(annotated_frame, fps_text, (10, 30), 
+                           cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
                 
-            start_time = time.time()
-            results = self.model(frame, conf=conf_threshold)
-            inference_time = time.time() - start_time
-            
-            # Annotate frame
-            annotated_frame = results[0].plot()
-            
-            # Add FPS info
-            fps_text = f"FPS: {1/inference_time:.1f}"
-            cv2.putText(annotated_frame, fps_text, (10, 30), 
-                       cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
-            
-            if save_output:
                 out.write(annotated_frame)
-            
-            frame_count += 1
-            total_time += inference_time
-            
-            # Optional: Display real-time (comment out for headless)
-            # cv2.imshow('YOLOv11 Detection', annotated_frame)
-            # if cv2.waitKey(1) & 0xFF == ord('q'):
-            #     break
+                
+                # Optional: Display real-time (comment out for headless)
+                # cv2.imshow('YOLOv11 Detection', annotated_frame)
+                # cv2.waitKey(1)
+            return len(items)
+        
+        pipeline = FramePipeline(batched(frames, batch_size),
+                                 [('inference', infer), ('annotate', annotate)],
+                                 queue_size=queue_size, threaded=pipelined, frames_per_item=int)
+        try:
+            report = pipeline.run()
+        finally:
+            cap.release()
+            if out is not None:
+                out.release()
         
-        cap.release()
         if save_output:
-            out.release()
             print(f"Processed video saved as: {output_path}")
+        pipeline.print_report()
+        if scheduler:
+            scheduler.print_counters()
+            report['scheduler'] = scheduler.counters()
         
-        avg_fps = frame_count / total_time
-        print(f"Average FPS: {avg_fps:.1f}")
+        report['detections'] = Detections.concat(collected)
+        if detections_path:
+            report['detections'].to_parquet(detections_path, self.class_names)
+            print(f"Detections saved as: {detections_path}")
         
         cv2.destroyAllWindows()
+        return report
     
-    def detect_webcam(self, conf_threshold=0.5):
-        """Real-time detection from webcam"""
+    def detect_webcam(self, conf_threshold=0.5, target_fps=None, motion_threshold=None):
+        """
+        Real-time detection from webcam
+        target_fps / motion_threshold: enable the FrameScheduler (see detect_video)
+        """
         cap = cv2.VideoCapture(0)  # Use default camera
+        scheduler = None
+        if target_fps is not None or motion_threshold is not None:
+            scheduler = FrameScheduler(target_fps, cap.get(cv2.CAP_PROP_FPS) or 30.0,
+                                       motion_threshold or 0.0)
         
         print("Starting webcam detection. Press 'q' to quit.")
         
+        results = None
+        fps = None
+        last_time = time.perf_counter()
+        
         while True:
             ret, frame = cap.read()
             if not ret:
                 break
             
-            start_time = time.time()
-            results = self.model(frame, conf=conf_threshold)
-            inference_time = time.time() - start_time
-            
-            # Annotate frame
-            annotated_frame = results[0].plot()
+            # Always consult the scheduler so it sees (and keeps a thumbnail of) every frame
+            infer = scheduler is None or scheduler.should_infer(frame)
+            if infer or results is None:
+                start_time = time.perf_counter()
+                results = self.model(frame, conf=conf_threshold)
+                if scheduler:
+                    scheduler.record_inference(time.perf_counter() - start_time)
+                # Annotate frame
+                annotated_frame = results[0].plot()
+            else:
+                # Reuse the last detections on the new frame
+                annotated_frame = results[0].plot(img=frame)
             
-            # Add performance info
-            fps = 1 / inference_time
+            # Add performance info: frames actually shown per second, not the model call alone
+            now = time.perf_counter()
+            loop_fps = 1 / max(now - last_time, 1e-6)
+            fps = loop_fps if fps is None else 0.9 * fps + 0.1 * loop_fps
+            last_time = now
             cv2.putText(annotated_frame, f"FPS: {fps:.1f}", (10, 30),
                        cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
             
@@ -142,9 +311,14 @@ class YOLODetector:
         
         cap.release()
         cv2.destroyAllWindows()
+        if scheduler:
+            scheduler.print_counters()
     
     def train_custom_model(self, dataset_yaml, epochs=100, img_size=640):
         """Train YOLOv11 on custom dataset"""
+        if self.backend != 'torch':
+            print("Training requires the torch backend.")
+            return
         print(f"Training custom YOLOv11 model...")
         print(f"Dataset: {dataset_yaml}")
         print(f"Epochs: {epochs}, Image size: {img_size}")
@@ -163,6 +337,9 @@ class YOLODetector:
     
     def export_model(self, format='onnx'):
         """Export model to different formats"""
+        if self.backend != 'torch':
+            print("Export requires the torch backend.")
+            return
         supported_formats = ['onnx', 'torchscript', 'tflite', 'edgetpu', 'tfjs']
         
         if format not in supported_formats:
@@ -173,6 +350,70 @@ class YOLODetector:
         self.model.export(format=format)
         print(f"Model exported successfully!")
 
+def tile_starts(length, tile_size, overlap):
+    """Start offsets of overlapping tiles covering [0, length); the last tile is flush with the edge"""
+    if length <= tile_size:
+        return [0]
+    step = max(1, int(tile_size * (1 - overlap)))
+    starts = list(range(0, length - tile_size, step))
+    return starts + [length - tile_size]
+
+def synthetic_frame(rng, height=480, width=640):
+    """Random-noise frame with a couple of solid shapes, like the demo's sample image"""
+    frame = rng.integers(0, 255, (height, width, 3), dtype=np.uint8)
+    x, y = int(rng.integers(0, width - 100)), int(rng.integers(0, height - 100))
+    cv2.rectangle(frame, (x, y), (x + 100, y + 100), (255, 0, 0), -1)
+    cv2.circle(frame, (width - x // 2 - 50, height - y // 2 - 50), 50, (0, 255, 0), -1)
+    return frame
+
+def benchmark_batch_sizes(detector, batch_sizes=(1, 4, 8, 16), n_images=64, warmup=2):
+    """Images/sec through detect_batch at each batch size on in-memory frames"""
+    rng = np.random.default_rng(0)
+    frames = [synthetic_frame(rng) for _ in range(n_images)]
+    print(f"{'batch':>5} {'img/s':>8} {'ms/img':>8}")
+    for batch_size in batch_sizes:
+        for _ in range(warmup):
+            list(detector.detect_batch(frames[:batch_size], batch_size=batch_size))
+        start = time.perf_counter()
+        for _ in detector.detect_batch(frames, batch_size=batch_size):
+            pass
+        elapsed = time.perf_counter() - start
+        print(f"{batch_size:>5} {n_images/elapsed:>8.1f} {elapsed/n_images*1000:>8.1f}")
+
+def benchmark_tiling(detector, image, tile_sizes=(1280, 960, 640, 480), overlap=0.2,
+                     conf_threshold=0.25, reference=None, repeat=3, workers=1):
+    """
+    Latency vs recall of detect_tiled at several tile sizes on one large image.
+    Recall is measured against `reference` Detections (e.g. labelled boxes);
+    without one, the union of all tiled runs after NMS stands in for ground truth.
+    The first row is a plain full-image call for comparison.
+    """
+    if isinstance(image, (str, Path)):
+        image = cv2.imread(str(image))
+    runs = {}
+    for tile_size in (None,) + tuple(tile_sizes):
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            if tile_size is None:
+                dets = Detections.from_results(detector.model(image, conf=conf_threshold, verbose=False))
+            else:
+                dets = detector.detect_tiled(image, tile_size, overlap, conf_threshold, workers=workers)
+            times.append(time.perf_counter() - start)
+        runs[tile_size] = (min(times), dets)
+    
+    if reference is None:
+        pooled = Detections.concat([d for _, d in runs.values()])
+        reference = pooled.select(batched_nms(pooled.xyxy, pooled.confidences, pooled.class_ids,
+                                              0.5, max_det=len(pooled)))
+    
+    print(f"{image.shape[1]}x{image.shape[0]} image, {len(reference)} reference boxes")
+    print(f"{'tile':>6} {'latency ms':>11} {'dets':>6} {'recall':>7}")
+    for tile_size, (latency, dets) in runs.items():
+        label = 'full' if tile_size is None else str(tile_size)
+        print(f"{label:>6} {latency*1000:>11.1f} {len(dets):>6} {dets.matched_fraction(reference):>7.1%}")
+    return runs
+
 def demo_yolo():
     """Demonstrate YOLOv11 capabilities"""
     print("🚀 YOLOv11 Object Detection Demo")
@@ -202,14 +443,19 @@ def demo_yolo():
     print(f"Classes: {len(detector.class_names)}")
     print(f"Sample classes: {list(detector.class_names.values())[:10]}")
     
-    # Performance benchmark
+    # Performance benchmark (see D16_ultralytics_bench.py for sweeps and JSON output)
     print(f"\n⚡ Performance Benchmark:")
-    start_time = time.time()
-    for _ in range(10):
-        detector.model('sample_image.jpg', verbose=False)
-    avg_time = (time.time() - start_time) / 10
-    print(f"Average inference time: {avg_time*1000:.1f}ms")
-    print(f"Theoretical max FPS: {1/avg_time:.1f}")
+    stats = bench_config(detector.model, 640, duration=5.0, warmup=5)
+    total = stats['total']
+    print(f"Latency p50/p90/p99/max: {total['p50_ms']:.1f} / {total['p90_ms']:.1f} / "
+          f"{total['p99_ms']:.1f} / {total['max_ms']:.1f} ms over {total['count']} calls")
+    for phase in ('preprocess', 'inference', 'postprocess', 'plot'):
+        print(f"  {phase:<12} p50 {stats[phase]['p50_ms']:.1f}ms")
+    print(f"Throughput: {stats['throughput_fps']:.1f} FPS")
+    
+    # Batched inference
+    print(f"\n📦 Batched inference (CPU):")
+    benchmark_batch_sizes(detector)
     
     print(f"\n✅ Demo completed! Check 'detected_sample_image.jpg' for results.")
 
@@ -0,0 +1,149 @@
+'''
+Latency benchmark for YOLODetector.
+
+Warms the model up, then runs each (model size, input resolution) pair for a
+fixed wall-clock duration on synthetic frames and reports p50/p90/p99/max
+latency split into preprocess / inference / postprocess / plot(). Results are
+written as JSON so runs from different versions or machines can be diffed.
+
+Usage:
+    python D16_ultralytics_bench.py run --models n s --imgsz 320 640 --duration 10 --out bench.json
+    python D16_ultralytics_bench.py diff old.json new.json
+'''
+
+from datetime import datetime, timezone
+import argparse
+import json
+import os
+import platform
+import time
+
+import numpy as np
+
+PHASES = ('preprocess', 'inference', 'postprocess', 'plot', 'total')
+
+def summarize(samples_ms):
+    """Percentile summary of a list of latencies in milliseconds"""
+    if not samples_ms:
+        return {'count': 0}
+    a = np.asarray(samples_ms)
+    return {
+        'count': int(a.size),
+        'mean_ms': float(a.mean()),
+        'p50_ms': float(np.percentile(a, 50)),
+        'p90_ms': float(np.percentile(a, 90)),
+        'p99_ms': float(np.percentile(a, 99)),
+        'max_ms': float(a.max()),
+    }
+
+def load_model(spec):
+    """'n', 's', ... load the matching yolo11 checkpoint; anything with a suffix is a path"""
+    from ultralytics import YOLO
+    return YOLO(spec if '.' in spec else f'yolo11{spec}.pt')
+
+def bench_config(model, imgsz, duration=10.0, warmup=10, plot=True, conf=0.25, n_frames=32, seed=0):
+    """
+    Time single-frame calls at one input resolution for `duration` seconds
+    after `warmup` untimed calls. Frames are built up front so disk and
+    decode time never show up in the numbers.
+    """
+    from D16_ultralytics import synthetic_frame
+    rng = np.random.default_rng(seed)
+    frames = [synthetic_frame(rng, imgsz, imgsz) for _ in range(n_frames)]
+    for i in range(warmup):
+        model(frames[i % n_frames], imgsz=imgsz, conf=conf, verbose=False)
+
+    samples = {phase: [] for phase in PHASES}
+    deadline = time.perf_counter() + duration
+    i = 0
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        result = model(frames[i % n_frames], imgsz=imgsz, conf=conf, verbose=False)[0]
+        if plot:
+            plot_start = time.perf_counter()
+            result.plot()
+            samples['plot'].append((time.perf_counter() - plot_start) * 1000)
+        samples['total'].append((time.perf_counter() - start) * 1000)
+        for phase in ('preprocess', 'inference', 'postprocess'):
+            samples[phase].append(result.speed[phase])
+        i += 1
+
+    stats = {phase: summarize(values) for phase, values in samples.items()}
+    stats['throughput_fps'] = 1000 / stats['total']['mean_ms']
+    return stats
+
+def environment():
+    info = {
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+    }
+    for name in ('ultralytics', 'torch', 'cv2', 'numpy'):
+        try:
+            info[name] = __import__(name).__version__
+        except ImportError:
+            info[name] = None
+    return info
+
+def run_sweep(models=('n',), imgsz=(640,), duration=10.0, warmup=10, plot=True, out=None):
+    """Benchmark every model x resolution pair; returns (and optionally writes) the JSON report"""
+    report = {
+        'environment': environment(),
+        'settings': {'duration_s': duration, 'warmup': warmup, 'plot': plot},
+        'results': [],
+    }
+    print(f"{'model':<6} {'imgsz':>5} {'fps':>6} {'p50':>7} {'p90':>7} {'p99':>7} {'max':>7} "
+          f"{'pre':>6} {'infer':>6} {'post':>6} {'plot':>6}")
+    for spec in models:
+        model = load_model(spec)
+        for size in imgsz:
+            stats = bench_config(model, size, duration, warmup, plot)
+            report['results'].append({'model': spec, 'imgsz': size, **stats})
+            t = stats['total']
+            phase_p50 = [stats[p].get('p50_ms', 0.0) for p in ('preprocess', 'inference', 'postprocess', 'plot')]
+            print(f"{spec:<6} {size:>5} {stats['throughput_fps']:>6.1f} {t['p50_ms']:>7.1f} {t['p90_ms']:>7.1f} "
+                  f"{t['p99_ms']:>7.1f} {t['max_ms']:>7.1f} " + ' '.join(f"{v:>6.1f}" for v in phase_p50))
+    if out:
+        with open(out, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {out}")
+    return report
+
+def diff(old_path, new_path, percentile='p50_ms'):
+    """Print the change in total and per-phase latency between two saved runs"""
+    with open(old_path) as f:
+        old = {(r['model'], r['imgsz']): r for r in json.load(f)['results']}
+    with open(new_path) as f:
+        new = {(r['model'], r['imgsz']): r for r in json.load(f)['results']}
+    print(f"{'model':<6} {'imgsz':>5} {'phase':<12} {'old':>8} {'new':>8} {'change':>8}")
+    for key in sorted(old.keys() & new.keys()):
+        for phase in PHASES:
+            a, b = old[key][phase].get(percentile), new[key][phase].get(percentile)
+            if a and b:
+                print(f"{key[0]:<6} {key[1]:>5} {phase:<12} {a:>8.1f} {b:>8.1f} {(b - a) / a:>+8.1%}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="YOLODetector latency benchmark")
+    sub = parser.add_subparsers(dest='command', required=True)
+    run = sub.add_parser('run')
+    run.add_argument('--models', nargs='+', default=['n'], help="sizes (n s m l x) or weight paths")
+    run.add_argument('--imgsz', nargs='+', type=int, default=[640])
+    run.add_argument('--duration', type=float, default=10.0, help="seconds per configuration")
+    run.add_argument('--warmup', type=int, default=10, help="untimed calls per configuration")
+    run.add_argument('--no-plot', action='store_true', help="skip timing results.plot()")
+    run.add_argument('--out', help="write JSON results here")
+    cmp = sub.add_parser('diff')
+    cmp.add_argument('old')
+    cmp.add_argument('new')
+    cmp.add_argument('--percentile', default='p50_ms', choices=['mean_ms', 'p50_ms', 'p90_ms', 'p99_ms', 'max_ms'])
+    args = parser.parse_args(argv)
+
+    if args.command == 'run':
+        run_sweep(args.models, args.imgsz, args.duration, args.warmup, not args.no_plot, args.out)
+    else:
+        diff(args.old, args.new, args.percentile)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+'''
+ONNX Runtime backend for YOLODetector.
+
+Runs the file written by YOLODetector.export_model('onnx') on the CPU with
+onnxruntime, using NumPy/OpenCV letterboxing and NumPy NMS instead of the
+ultralytics/torch stack. OnnxYOLO is called like an ultralytics YOLO model
+and returns result objects with the same .boxes.cls / .conf / .xyxy, .names,
+.speed and .plot() surface, so YOLODetector's methods work unchanged.
+
+Usage:
+    python D16_ultralytics_onnx.py yolo11n.pt yolo11n.onnx --int8
+'''
+
+from pathlib import Path
+import argparse
+import ast
+import time
+
+import cv2
+import numpy as np
+import onnxruntime as ort
+
+from D16_ultralytics_results import _to_numpy, batched_nms, box_iou
+
+def letterbox(img, new_shape=(640, 640), color=(114, 114, 114)):
+    """
+    Resize keeping aspect ratio and pad to new_shape (h, w), centred like
+    ultralytics does for fixed-size exports. Returns the padded image, the
+    scale ratio and the (left, top) padding.
+    """
+    h, w = img.shape[:2]
+    ratio = min(new_shape[0] / h, new_shape[1] / w)
+    new_w, new_h = round(w * ratio), round(h * ratio)
+    pad_w, pad_h = (new_shape[1] - new_w) / 2, (new_shape[0] - new_h) / 2
+    if (new_w, new_h) != (w, h):
+        img = cv2.resize(img, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    top, bottom = round(pad_h - 0.1), round(pad_h + 0.1)
+    left, right = round(pad_w - 0.1), round(pad_w + 0.1)
+    img = cv2.copyMakeBorder(img, top, bottom, left, right, cv2.BORDER_CONSTANT, value=color)
+    return img, ratio, (left, top)
+
+class OnnxBoxes:
+    """
+    Detections for one image as NumPy arrays. Iterating yields one OnnxBoxes
+    per detection, with the same [0]-indexable shapes ultralytics uses.
+    """
+    def __init__(self, xyxy, conf, cls):
+        self.xyxy = xyxy
+        self.conf = conf
+        self.cls = cls
+
+    @property
+    def data(self):
+        return np.concatenate([self.xyxy, self.conf[:, None], self.cls[:, None]], axis=1)
+
+    def __len__(self):
+        return len(self.conf)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield OnnxBoxes(self.xyxy[i:i+1], self.conf[i:i+1], self.cls[i:i+1])
+
+class OnnxResults:
+    """Result for one image, mirroring the parts of ultralytics Results we use"""
+    def __init__(self, orig_img, boxes, names, speed, path=None):
+        self.orig_img = orig_img
+        self.boxes = boxes
+        self.names = names
+        self.speed = speed
+        self.path = path
+
+    def plot(self, line_width=2, img=None):
+        """Draw boxes and labels on a copy of the original image (or on img)"""
+        img = self.orig_img.copy() if img is None else img
+        for (x1, y1, x2, y2), conf, cls in zip(self.boxes.xyxy.astype(int), self.boxes.conf, self.boxes.cls):
+            color = _color(int(cls))
+            cv2.rectangle(img, (x1, y1), (x2, y2), color, line_width)
+            label = f"{self.names.get(int(cls), int(cls))} {conf:.2f}"
+            cv2.putText(img, label, (x1, max(y1 - 4, 12)), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 1)
+        return img
+
+def _color(cls):
+    rng = np.random.default_rng(cls)
+    return tuple(int(c) for c in rng.integers(0, 255, 3))
+
+class OnnxYOLO:
+    """
+    Callable stand-in for ultralytics.YOLO backed by an exported ONNX model.
+    model(source, conf=0.25, iou=0.7) takes a path, an ndarray (BGR) or a
+    list of them and returns a list of OnnxResults.
+    """
+    def __init__(self, onnx_path, intra_op_threads=None):
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if intra_op_threads:
+            options.intra_op_num_threads = intra_op_threads
+        self.session = ort.InferenceSession(str(onnx_path), options, providers=['CPUExecutionProvider'])
+        self.input = self.session.get_inputs()[0]
+        meta = self.session.get_modelmeta().custom_metadata_map
+        self.names = ast.literal_eval(meta['names']) if 'names' in meta else {}
+        self.end2end = meta.get('end2end') == 'True'
+        shape = self.input.shape
+        imgsz = ast.literal_eval(meta['imgsz']) if 'imgsz' in meta else shape[2:]
+        self.imgsz = tuple(imgsz)
+        # Fixed batch-1 exports have to be fed one image at a time
+        self.max_batch = shape[0] if isinstance(shape[0], int) else None
+
+    def __call__(self, source, conf=0.25, iou=0.7, max_det=300, verbose=False, **kwargs):
+        images = source if isinstance(source, (list, tuple)) else [source]
+        results = []
+        step = self.max_batch or len(images)
+        for i in range(0, len(images), step):
+            results.extend(self._run(images[i:i + step], conf, iou, max_det))
+        if verbose:
+            for r in results:
+                print(f"{len(r.boxes)} detections, {r.speed['inference']:.1f}ms")
+        return results
+
+    def preprocess(self, images):
+        """Letterbox, BGR->RGB, HWC->CHW, scale to [0, 1] and stack into one batch"""
+        batch, meta = [], []
+        for img in images:
+            boxed, ratio, pad = letterbox(img, self.imgsz)
+            batch.append(boxed[:, :, ::-1].transpose(2, 0, 1))
+            meta.append((ratio, pad))
+        return np.ascontiguousarray(np.stack(batch), dtype=np.float32) / 255.0, meta
+
+    def postprocess(self, pred, orig_shape, ratio, pad, conf, iou, max_det):
+        """Turn one image's raw output into OnnxBoxes in original-image pixels"""
+        if self.end2end:
+            # (max_det, 6): x1, y1, x2, y2, score, class, already de-duplicated
+            pred = pred[pred[:, 4] > conf]
+            boxes, scores, classes = pred[:, :4], pred[:, 4], pred[:, 5].astype(np.int64)
+        else:
+            # (4 + num_classes, anchors): cx, cy, w, h, class scores
+            pred = pred.T
+            class_scores = pred[:, 4:]
+            classes = class_scores.argmax(1)
+            scores = class_scores[np.arange(len(classes)), classes]
+            mask = scores > conf
+            cxcywh, scores, classes = pred[mask, :4], scores[mask], classes[mask]
+            boxes = np.empty_like(cxcywh)
+            boxes[:, :2] = cxcywh[:, :2] - cxcywh[:, 2:] / 2
+            boxes[:, 2:] = cxcywh[:, :2] + cxcywh[:, 2:] / 2
+            keep = batched_nms(boxes, scores, classes, iou, max_det)
+            boxes, scores, classes = boxes[keep], scores[keep], classes[keep]
+
+        boxes = (boxes - np.array([pad[0], pad[1], pad[0], pad[1]], dtype=np.float32)) / ratio
+        boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, orig_shape[1])
+        boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, orig_shape[0])
+        return OnnxBoxes(boxes.astype(np.float32), scores.astype(np.float32), classes.astype(np.float32))
+
+    def _run(self, sources, conf, iou, max_det):
+        paths = [s if isinstance(s, (str, Path)) else None for s in sources]
+        images = [cv2.imread(str(s)) if p else s for s, p in zip(sources, paths)]
+
+        t0 = time.perf_counter()
+        batch, meta = self.preprocess(images)
+        t1 = time.perf_counter()
+        preds = self.session.run(None, {self.input.name: batch})[0]
+        t2 = time.perf_counter()
+        results = []
+        for img, path, pred, (ratio, pad) in zip(images, paths, preds, meta):
+            boxes = self.postprocess(pred, img.shape, ratio, pad, conf, iou, max_det)
+            results.append(OnnxResults(img, boxes, self.names, {}, path))
+        t3 = time.perf_counter()
+
+        n = len(images)
+        speed = {'preprocess': (t1 - t0) * 1000 / n, 'inference': (t2 - t1) * 1000 / n,
+                 'postprocess': (t3 - t2) * 1000 / n}
+        for r in results:
+            r.speed = speed
+        return results
+
+def quantize_int8(onnx_path, out_path=None):
+    """Write a dynamically quantized (INT8 weights) copy of an ONNX model; reuses it if present"""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    onnx_path = Path(onnx_path)
+    out_path = Path(out_path or onnx_path.with_name(f"{onnx_path.stem}.int8.onnx"))
+    if not out_path.exists() or out_path.stat().st_mtime < onnx_path.stat().st_mtime:
+        quantize_dynamic(str(onnx_path), str(out_path), weight_type=QuantType.QUInt8)
+    return out_path
+
+def _match(ref, other, iou_threshold=0.5):
+    """
+    Fraction of ref boxes matched by a same-class box in other (1.0 for a
+    frame without ref boxes), and the IoUs of the matched pairs. Misses only
+    lower the match rate; they are not averaged into IoU as zeros.
+    """
+    if len(ref) == 0:
+        return 1.0, []
+    matched, ious = 0, []
+    for box, cls in zip(ref.xyxy, ref.cls):
+        same = other.xyxy[other.cls == cls]
+        if len(same):
+            best = box_iou(box, same).max()
+            if best >= iou_threshold:
+                matched += 1
+                ious.append(float(best))
+    return matched / len(ref), ious
+
+def compare_backends(weights, onnx_path, n_frames=50, conf=0.25, int8=False, images=None):
+    """
+    Run the PyTorch model and the ONNX model (and its INT8 copy) over the same
+    frames, then print latency and how many PyTorch detections each ONNX
+    variant reproduces (same class, IoU >= 0.5).
+    """
+    from ultralytics import YOLO
+    from D16_ultralytics import synthetic_frame
+    from D16_ultralytics_bench import summarize
+
+    if images:
+        frames = [cv2.imread(str(p)) for p in images]
+    else:
+        rng = np.random.default_rng(0)
+        frames = [synthetic_frame(rng) for _ in range(n_frames)]
+
+    backends = {'torch': YOLO(weights), 'onnx': OnnxYOLO(onnx_path)}
+    if int8:
+        backends['onnx-int8'] = OnnxYOLO(quantize_int8(onnx_path))
+
+    outputs, timings = {}, {}
+    for name, model in backends.items():
+        model(frames[0], conf=conf, verbose=False)  # warmup
+        outputs[name], timings[name] = [], []
+        for frame in frames:
+            start = time.perf_counter()
+            result = model(frame, conf=conf, verbose=False)[0]
+            timings[name].append((time.perf_counter() - start) * 1000)
+            boxes = result.boxes
+            outputs[name].append(OnnxBoxes(_to_numpy(boxes.xyxy), _to_numpy(boxes.conf), _to_numpy(boxes.cls)))
+
+    print(f"{'backend':<10} {'p50 ms':>8} {'p90 ms':>8} {'dets':>6} {'recall':>7} {'mean IoU':>9}")
+    for name in backends:
+        lat = summarize(timings[name])
+        matches = [_match(ref, out) for ref, out in zip(outputs['torch'], outputs[name])]
+        recall = np.mean([m[0] for m in matches])
+        # Mean over matched pairs only: localization quality, with misses in recall
+        ious = [iou for m in matches for iou in m[1]]
+        mean_iou = np.mean(ious) if ious else float('nan')
+        dets = sum(len(b) for b in outputs[name])
+        print(f"{name:<10} {lat['p50_ms']:>8.1f} {lat['p90_ms']:>8.1f} {dets:>6} {recall:>7.1%} {mean_iou:>9.3f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare PyTorch and ONNX Runtime YOLO backends")
+    parser.add_argument('weights', help="PyTorch weights, e.g. yolo11n.pt")
+    parser.add_argument('onnx', help="ONNX file from YOLODetector.export_model('onnx')")
+    parser.add_argument('--int8', action='store_true', help="also test a dynamically quantized copy")
+    parser.add_argument('--frames', type=int, default=50)
+    parser.add_argument('--conf', type=float, default=0.25)
+    parser.add_argument('--images', nargs='*', help="use these images instead of synthetic frames")
+    args = parser.parse_args()
+    compare_backends(args.weights, args.onnx, args.frames, args.conf, args.int8, args.images)
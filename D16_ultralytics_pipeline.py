@@ -0,0 +1,320 @@
+'''
+Staged frame pipeline for YOLODetector.
+
+Runs decode -> inference -> annotate/encode on separate threads joined by
+bounded queues. OpenCV and PyTorch release the GIL while they work, so video
+decode and encode overlap with the model instead of waiting on it. A full
+queue blocks the stage in front of it (backpressure), and since each stage is
+a single thread reading a FIFO queue, frames come out in the order they went in.
+'''
+
+import queue
+import threading
+import time
+
+import cv2
+import numpy as np
+
+_DONE = object()
+
+class _SourceError:
+    """Carries an exception from batched()'s feeder thread to the consumer"""
+    __slots__ = ('exc',)
+
+    def __init__(self, exc):
+        self.exc = exc
+
+def batched(source, batch_size, max_latency=None):
+    """
+    Group items from any iterable into lists of up to batch_size.
+    With max_latency (seconds) a partial batch is flushed once its first item
+    has waited that long, so a slow live stream never stalls for a full batch;
+    the source is then read on a background thread.
+    """
+    if max_latency is None:
+        batch = []
+        for item in source:
+            batch.append(item)
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+        return
+
+    q = queue.Queue(maxsize=batch_size * 2)
+    stop = threading.Event()
+
+    def put(item):
+        # Give up once the consumer is gone, instead of blocking on a full queue forever
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def feed():
+        end = _DONE
+        try:
+            for item in source:
+                if not put(item):
+                    return
+        except BaseException as exc:
+            end = _SourceError(exc)
+        finally:
+            put(end)
+    threading.Thread(target=feed, name='batched-source', daemon=True).start()
+
+    batch, deadline = [], None
+    try:
+        while True:
+            try:
+                timeout = None if deadline is None else max(0.0, deadline - time.perf_counter())
+                item = q.get(timeout=timeout)
+            except queue.Empty:
+                yield batch
+                batch, deadline = [], None
+                continue
+            if item is _DONE:
+                break
+            if type(item) is _SourceError:
+                raise item.exc
+            batch.append(item)
+            if deadline is None:
+                deadline = time.perf_counter() + max_latency
+            if len(batch) == batch_size:
+                yield batch
+                batch, deadline = [], None
+        if batch:
+            yield batch
+    finally:
+        stop.set()
+
+class FrameScheduler:
+    """
+    Decides which frames are worth running the model on.
+
+    - target_fps: infer at most this many frames per second of source video
+    - motion_threshold: skip frames whose downscaled grayscale image differs
+      from the last inferred one by less than this mean absolute value (0-255)
+    - max_static: still infer at least every max_static frames so detections
+      never go stale on a static scene
+    - adaptive stride: when the model is slower than the source frame rate,
+      skip enough frames to keep up (at most max_stride - 1 in a row)
+
+    Skipped frames should reuse the last detections. Counters: decoded,
+    inferred, skipped_motion, skipped_stride.
+    """
+    def __init__(self, target_fps=None, source_fps=30.0, motion_threshold=2.0,
+                 max_static=30, max_stride=8, thumb_size=(64, 36)):
+        self.target_fps = target_fps
+        self.source_fps = source_fps or 30.0
+        self.motion_threshold = motion_threshold
+        self.max_static = max_static
+        self.max_stride = max_stride
+        self.thumb_size = thumb_size
+        self.base_stride = max(1, round(self.source_fps / target_fps)) if target_fps else 1
+        self.stride = self.base_stride
+        self._infer_ema = None
+        self._last_thumb = None
+        self._since_inference = 0
+        self.decoded = self.inferred = self.skipped_motion = self.skipped_stride = 0
+
+    def should_infer(self, frame):
+        """Call once per decoded frame; True if the model should see it"""
+        self.decoded += 1
+        self._since_inference += 1
+        if self._last_thumb is not None and self._since_inference < self.stride:
+            self.skipped_stride += 1
+            return False
+        thumb = self._thumbnail(frame)
+        if (self.motion_threshold and self._last_thumb is not None
+                and self._since_inference < self.max_static
+                and cv2.absdiff(thumb, self._last_thumb).mean() < self.motion_threshold):
+            self.skipped_motion += 1
+            return False
+        self._last_thumb = thumb
+        self._since_inference = 0
+        self.inferred += 1
+        return True
+
+    def record_inference(self, seconds):
+        """Feed back how long a model call took so the stride can adapt"""
+        self._infer_ema = seconds if self._infer_ema is None else 0.8 * self._infer_ema + 0.2 * seconds
+        behind = int(np.ceil(self._infer_ema * self.source_fps))
+        self.stride = int(np.clip(max(self.base_stride, behind), 1, self.max_stride))
+
+    def counters(self):
+        return {'decoded': self.decoded, 'inferred': self.inferred,
+                'skipped_motion': self.skipped_motion, 'skipped_stride': self.skipped_stride,
+                'stride': self.stride}
+
+    def print_counters(self):
+        c = self.counters()
+        saved = 1 - c['inferred'] / c['decoded'] if c['decoded'] else 0.0
+        print(f"Frames decoded {c['decoded']}, inferred {c['inferred']}, "
+              f"skipped {c['skipped_motion']} static + {c['skipped_stride']} stride "
+              f"({saved:.0%} of inference saved, current stride {c['stride']})")
+
+    def _thumbnail(self, frame):
+        small = cv2.resize(frame, self.thumb_size, interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+
+class StageStats:
+    """Per-stage latencies in seconds"""
+    def __init__(self, name):
+        self.name = name
+        self.latencies = []
+
+    def summary(self):
+        if not self.latencies:
+            return {'count': 0}
+        ms = np.array(self.latencies) * 1000
+        return {
+            'count': len(ms),
+            'mean_ms': float(ms.mean()),
+            'p50_ms': float(np.percentile(ms, 50)),
+            'p95_ms': float(np.percentile(ms, 95)),
+            'max_ms': float(ms.max()),
+        }
+
+class FramePipeline:
+    """
+    Push every item of `source` through `stages`, a list of (name, fn) pairs
+    where each fn takes the previous stage's output. With threaded=True each
+    stage (and the source) gets its own thread and a queue of queue_size items
+    in front of it; with threaded=False the same stages run in a plain loop,
+    which is handy as a baseline.
+    """
+    def __init__(self, source, stages, queue_size=8, threaded=True, source_name='decode',
+                 frames_per_item=None):
+        self.source = source
+        self.stages = stages
+        self.queue_size = queue_size
+        self.threaded = threaded
+        # For batched stages: maps the last stage's output to how many frames it carried
+        self.frames_per_item = frames_per_item
+        self.stats = {name: StageStats(name) for name in [source_name] + [n for n, _ in stages]}
+        self.end_to_end = StageStats('end_to_end')
+        self._source_stats = self.stats[source_name]
+        self._stop = threading.Event()
+        self._error = None
+        self.frames = 0
+        self.wall_time = 0.0
+
+    def run(self):
+        """Process the whole source and return report()"""
+        start = time.perf_counter()
+        if self.threaded:
+            self._run_threaded()
+        else:
+            for item in self._timed_source():
+                for name, fn in self.stages:
+                    item = self._timed(name, fn, item)
+                self._finish(item)
+        self.wall_time = time.perf_counter() - start
+        return self.report()
+
+    def stop(self):
+        """Ask every stage to wind down early (e.g. the user pressed 'q')"""
+        self._stop.set()
+
+    def report(self):
+        return {
+            'frames': self.frames,
+            'wall_time_s': self.wall_time,
+            'fps': self.frames / self.wall_time if self.wall_time else 0.0,
+            'stages': {name: s.summary() for name, s in self.stats.items()},
+            'end_to_end': self.end_to_end.summary(),
+        }
+
+    def print_report(self):
+        r = self.report()
+        print(f"{'stage':<12} {'mean ms':>8} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8}")
+        for name, s in list(r['stages'].items()) + [('end_to_end', r['end_to_end'])]:
+            if s['count']:
+                print(f"{name:<12} {s['mean_ms']:>8.1f} {s['p50_ms']:>8.1f} "
+                      f"{s['p95_ms']:>8.1f} {s['max_ms']:>8.1f}")
+        print(f"{r['frames']} frames in {r['wall_time_s']:.2f}s -> {r['fps']:.1f} FPS end-to-end")
+
+    def _timed_source(self):
+        it = iter(self.source)
+        while not self._stop.is_set():
+            t0 = time.perf_counter()
+            try:
+                item = next(it)
+            except StopIteration:
+                return
+            self._source_stats.latencies.append(time.perf_counter() - t0)
+            yield (t0, item)
+
+    def _timed(self, name, fn, wrapped):
+        t0, item = wrapped
+        start = time.perf_counter()
+        item = fn(item)
+        self.stats[name].latencies.append(time.perf_counter() - start)
+        return (t0, item)
+
+    def _finish(self, wrapped):
+        self.end_to_end.latencies.append(time.perf_counter() - wrapped[0])
+        self.frames += self.frames_per_item(wrapped[1]) if self.frames_per_item else 1
+
+    def _put(self, q, item):
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _get(self, q):
+        while not self._stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        return _DONE
+
+    def _guard(self, target, *args):
+        try:
+            target(*args)
+        except BaseException as e:
+            self._error = self._error or e
+            self._stop.set()
+
+    def _produce(self, out_q):
+        for wrapped in self._timed_source():
+            if not self._put(out_q, wrapped):
+                return
+        self._put(out_q, _DONE)
+
+    def _work(self, name, fn, in_q, out_q):
+        while True:
+            wrapped = self._get(in_q)
+            if wrapped is _DONE:
+                break
+            wrapped = self._timed(name, fn, wrapped)
+            if out_q is None:
+                self._finish(wrapped)
+            elif not self._put(out_q, wrapped):
+                return
+        if out_q is not None:
+            self._put(out_q, _DONE)
+
+    def _run_threaded(self):
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in self.stages]
+        threads = [threading.Thread(target=self._guard, args=(self._produce, queues[0]),
+                                    name='pipeline-source', daemon=True)]
+        for i, (name, fn) in enumerate(self.stages):
+            out_q = queues[i + 1] if i + 1 < len(queues) else None
+            threads.append(threading.Thread(target=self._guard, args=(self._work, name, fn, queues[i], out_q),
+                                            name=f"pipeline-{name}", daemon=True))
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        if self._error is not None:
+            raise self._error
@@ -0,0 +1,136 @@
+'''
+Columnar detection results for YOLODetector.
+
+Pulls each image's boxes out of the model results in one transfer
+(boxes.data -> NumPy) instead of one tensor->Python round-trip per box, and
+keeps whole videos or batches as flat arrays that turn into a Polars
+DataFrame or Parquet file in one call.
+'''
+
+import numpy as np
+
+def box_iou(box, boxes):
+    """IoU of one xyxy box against an (N, 4) array of xyxy boxes"""
+    x1 = np.maximum(box[0], boxes[:, 0])
+    y1 = np.maximum(box[1], boxes[:, 1])
+    x2 = np.minimum(box[2], boxes[:, 2])
+    y2 = np.minimum(box[3], boxes[:, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area = (box[2] - box[0]) * (box[3] - box[1])
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    return inter / (area + areas - inter + 1e-9)
+
+def nms(boxes, scores, iou_threshold=0.7, max_det=300):
+    """
+    Greedy NMS; returns kept indices sorted by score. Each step suppresses
+    every remaining box overlapping the current best in one array operation.
+    """
+    order = np.argsort(-scores)
+    keep = []
+    while order.size and len(keep) < max_det:
+        best = order[0]
+        keep.append(best)
+        rest = order[1:]
+        order = rest[box_iou(boxes[best], boxes[rest]) <= iou_threshold]
+    return np.array(keep, dtype=np.int64)
+
+def batched_nms(boxes, scores, classes, iou_threshold=0.7, max_det=300):
+    """Class-aware NMS: offset each class into its own region so boxes of different classes never overlap"""
+    offsets = classes[:, None].astype(np.float32) * (boxes.max() + 1 if boxes.size else 0)
+    return nms(boxes + offsets, scores, iou_threshold, max_det)
+
+def _to_numpy(x):
+    return x.cpu().numpy() if hasattr(x, 'cpu') else np.asarray(x)
+
+class Detections:
+    """
+    Detections from any number of frames as contiguous columns:
+    frame_index (int64), class_ids (int64), confidences (float32), xyxy (float32, N x 4).
+    """
+    def __init__(self, frame_index, class_ids, confidences, xyxy):
+        self.frame_index = frame_index
+        self.class_ids = class_ids
+        self.confidences = confidences
+        self.xyxy = xyxy
+
+    @classmethod
+    def empty(cls):
+        return cls(np.empty(0, np.int64), np.empty(0, np.int64),
+                   np.empty(0, np.float32), np.empty((0, 4), np.float32))
+
+    @classmethod
+    def from_results(cls, results, start_index=0):
+        """Build from a list of per-image results; image i gets frame index start_index + i"""
+        data, frames = [], []
+        for i, r in enumerate(results):
+            if r.boxes is None or len(r.boxes) == 0:
+                continue
+            # (n, 6): x1, y1, x2, y2, conf, cls  (tracking inserts an id column before conf)
+            d = _to_numpy(r.boxes.data)
+            data.append(d)
+            frames.append(np.full(len(d), start_index + i, dtype=np.int64))
+        if not data:
+            return cls.empty()
+        data = np.concatenate(data)
+        return cls(np.concatenate(frames), data[:, -1].astype(np.int64),
+                   data[:, -2].astype(np.float32), np.ascontiguousarray(data[:, :4], dtype=np.float32))
+
+    @classmethod
+    def concat(cls, parts):
+        parts = [p for p in parts if len(p)]
+        if not parts:
+            return cls.empty()
+        return cls(np.concatenate([p.frame_index for p in parts]),
+                   np.concatenate([p.class_ids for p in parts]),
+                   np.concatenate([p.confidences for p in parts]),
+                   np.concatenate([p.xyxy for p in parts]))
+
+    def __len__(self):
+        return len(self.class_ids)
+
+    def select(self, index):
+        """Subset by boolean mask or integer index array"""
+        return Detections(self.frame_index[index], self.class_ids[index],
+                          self.confidences[index], self.xyxy[index])
+
+    def matched_fraction(self, reference, iou_threshold=0.5):
+        """Share of reference boxes that have a same-class, same-frame box here with IoU >= iou_threshold"""
+        if not len(reference):
+            return 1.0
+        matched = 0
+        for frame, cls, box in zip(reference.frame_index, reference.class_ids, reference.xyxy):
+            same = self.xyxy[(self.class_ids == cls) & (self.frame_index == frame)]
+            if len(same) and box_iou(box, same).max() >= iou_threshold:
+                matched += 1
+        return matched / len(reference)
+
+    def class_labels(self, class_names):
+        """Class names for every detection, looked up as one array index"""
+        if not len(self):
+            return np.empty(0, dtype=object)
+        table = np.array([class_names.get(i, str(i)) for i in range(int(self.class_ids.max()) + 1)], dtype=object)
+        return table[self.class_ids]
+
+    def to_polars(self, class_names=None):
+        import polars as pl
+        columns = {
+            'frame': self.frame_index,
+            'class_id': self.class_ids,
+            'confidence': self.confidences,
+            'x1': self.xyxy[:, 0], 'y1': self.xyxy[:, 1],
+            'x2': self.xyxy[:, 2], 'y2': self.xyxy[:, 3],
+        }
+        if class_names is not None:
+            columns['class_name'] = pl.Series(self.class_labels(class_names).tolist(), dtype=pl.String)
+        return pl.DataFrame(columns)
+
+    def to_parquet(self, path, class_names=None):
+        self.to_polars(class_names).write_parquet(path)
+        return path
+
+    def print(self, class_names):
+        for cls_id, conf, coords in zip(self.class_ids.tolist(), self.confidences.tolist(), self.xyxy.tolist()):
+            print(f"Detected: {class_names[cls_id]} "
+                  f"(confidence: {conf:.2f}) "
+                  f"at [{coords[0]:.0f}, {coords[1]:.0f}, "
+                  f"{coords[2]:.0f}, {coords[3]:.0f}]")